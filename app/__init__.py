@@ -4,11 +4,15 @@ from flask_bcrypt import Bcrypt
 from flask_cors import CORS
 from flask_session import Session
 from config import Config
+from .utils.jobs import JobQueue
+from .utils.cache import ResponseCache
 import os
 
 db = SQLAlchemy()
 bcrypt = Bcrypt()
 session = Session()
+job_queue = JobQueue()
+response_cache = ResponseCache()
 
 def create_app():
     app = Flask(__name__)
@@ -16,7 +20,20 @@ def create_app():
 
     db.init_app(app)
     bcrypt.init_app(app)
-    session.init_app(app)
+    job_queue.init_app(app)
+    response_cache.init_app(app)
+
+    from .utils import sessions
+    sessions.init_app(app, session)
+
+    from .utils.hashing import password_hasher
+    password_hasher.init_app(app)
+
+    from .utils.engine_router import engine_router
+    engine_router.init_app(app)
+
+    from .utils.translate import translation_service
+    translation_service.init_app(app)
     
     # Configure CORS for production
     if os.environ.get('RAILWAY_ENVIRONMENT'):
@@ -33,24 +50,50 @@ def create_app():
     # Ensure instance folder exists
     os.makedirs(app.instance_path, exist_ok=True)
 
+    from .utils.singleflight import single_flight
+    single_flight.init_app(app)
+
+    from .utils.token_store import token_manager
+    token_manager.init_app(app)
+
+    from .utils.rate_limit import rate_limiter
+    rate_limiter.init_app(app)
+
+    from .utils.catalogue import catalogue
+    catalogue.init_app(app)
+
+    # Also registers the Generation events that keep the index current
+    from .utils.search import search_index
+    search_index.init_app(app)
+
     with app.app_context():
         # Import middleware
         from .middleware import auth_middleware
         
         # Register blueprints
-        from .routes import auth, generate
+        from .routes import auth, generate, metrics
         app.register_blueprint(auth.bp)
         app.register_blueprint(generate.bp)
-        
-        # Register middleware
-        app.before_request(auth_middleware.load_logged_in_user)
+        if app.config.get('METRICS_ENABLED', True):
+            app.register_blueprint(metrics.bp)
 
-        # Import models and create tables
+        # Request timing runs first so the auth stage is inside it
+        from .utils import metrics as request_metrics
+        request_metrics.init_app(app)
+
+        # Register middleware (lazy g.user and the request hook)
+        auth_middleware.init_app(app)
+
+        # Import models; tables are created by `flask init-db`, or here when AUTO_CREATE_SCHEMA is set
         from . import models
-        try:
-            db.create_all()
-            app.logger.info("Database tables created successfully")
-        except Exception as e:
-            app.logger.error(f"Error creating database tables: {e}")
+        from .commands import init_schema, register_commands
+        if app.config.get('AUTO_CREATE_SCHEMA', False):
+            try:
+                init_schema()
+                app.logger.info("Database tables created successfully")
+            except Exception as e:
+                app.logger.error(f"Error creating database tables: {e}")
+
+    register_commands(app)
 
     return app
\ No newline at end of file
@@ -0,0 +1,102 @@
+import click
+from flask import current_app
+from sqlalchemy import bindparam, inspect, text
+from sqlalchemy.types import LargeBinary
+from . import db
+
+def register_commands(app):
+    app.cli.add_command(init_db)
+    app.cli.add_command(compress_responses)
+    app.cli.add_command(reindex_search)
+    app.cli.add_command(install_translation)
+
+def init_schema():
+    """Create missing tables, plus indexes added to tables that already exist"""
+    from .models import Generation
+    from .utils.search import search_index
+
+    db.create_all()
+    # create_all skips existing tables, so add columns and indexes introduced since they were created
+    _ensure_compressed_column()
+    for index in Generation.__table__.indexes:
+        index.create(db.engine, checkfirst=True)
+    if current_app.config.get('SEARCH_ENABLED', True):
+        search_index.create_schema(db.engine)
+
+@click.command('init-db')
+def init_db():
+    """Create the database tables and indexes"""
+    init_schema()
+    click.echo("Database tables created")
+
+def _ensure_compressed_column():
+    """Add generation.response_compressed to databases created before it existed"""
+    columns = [column['name'] for column in inspect(db.engine).get_columns('generation')]
+    if 'response_compressed' in columns:
+        return False
+    column_type = LargeBinary().compile(dialect=db.engine.dialect)
+    with db.engine.begin() as conn:
+        conn.execute(text(f"ALTER TABLE generation ADD COLUMN response_compressed {column_type}"))
+    return True
+
+@click.command('compress-responses')
+@click.option('--batch-size', default=500, show_default=True, help='Rows converted per transaction.')
+def compress_responses(batch_size):
+    """Move existing generation responses into the compressed column"""
+    from .models import CompressedText, Generation
+
+    if _ensure_compressed_column():
+        click.echo("Added generation.response_compressed column")
+
+    table = Generation.__table__
+    select_batch = table.select() \
+        .with_only_columns(table.c.id, table.c.response) \
+        .where(table.c.response.isnot(None)) \
+        .where(table.c.id > bindparam('last_id')) \
+        .order_by(table.c.id) \
+        .limit(batch_size)
+    compress_row = table.update() \
+        .where(table.c.id == bindparam('row_id')) \
+        .values(response_compressed=bindparam('content', type_=CompressedText()), response=None)
+
+    last_id = 0
+    converted = 0
+    while True:
+        with db.engine.begin() as conn:
+            rows = conn.execute(select_batch, {'last_id': last_id}).all()
+            if not rows:
+                break
+            conn.execute(compress_row, [{'row_id': row.id, 'content': row.response} for row in rows])
+        last_id = rows[-1].id
+        converted += len(rows)
+        click.echo(f"Compressed {converted} responses (up to id {last_id})")
+
+    click.echo(f"Done: {converted} responses compressed")
+    if not current_app.config.get('COMPRESS_RESPONSES'):
+        click.echo("Set COMPRESS_RESPONSES=true so new rows are compressed and history reads load the compressed column")
+
+@click.command('reindex-search')
+@click.option('--batch-size', default=500, show_default=True, help='Rows indexed per transaction.')
+def reindex_search(batch_size):
+    """Rebuild the full-text search index from the generation table"""
+    from .utils.search import search_index
+
+    if not search_index.supports(db.engine):
+        raise click.ClickException(f"Full-text search is not supported on {db.engine.dialect.name}")
+
+    def progress(indexed, last_id):
+        click.echo(f"Indexed {indexed} generations (up to id {last_id})")
+
+    indexed = search_index.reindex(db.engine, batch_size, progress)
+    click.echo(f"Done: {indexed} generations indexed")
+
+@click.command('install-translation')
+def install_translation():
+    """Download the en->bn translation packages if they aren't installed"""
+    from .utils.translate import translation_service
+
+    # A failed download shouldn't stop the app from starting; Bangla requests report it instead
+    if translation_service.install():
+        click.echo("Translation packages installed")
+    else:
+        click.echo("Translation packages could not be installed; Bangla translation is unavailable", err=True)
@@ -1,32 +1,116 @@
-from flask import session, g, request, jsonify
+from collections import namedtuple
+from flask import session, g, request, jsonify, make_response
+from flask.ctx import _AppCtxGlobals
 from functools import wraps
+from sqlalchemy import event, inspect, select
+from app import db
 from app.models import User
-from datetime import datetime, timedelta
-from flask import current_app as app
+from app.utils.cache import LRUCache
+from app.utils.metrics import timed_stage
+from app.utils.rate_limit import rate_limiter, rate_limit_headers
 from app.routes.auth import validate_token
 
+# The user fields needed on every request, cached briefly per worker
+Identity = namedtuple('Identity', ['id', 'is_paid'])
+
+_identity_cache = LRUCache(4096, 30)
+
+class RequestGlobals(_AppCtxGlobals):
+    """Flask `g` whose user attributes resolve lazily from g.user_id
+
+    g.identity reads (id, is_paid) through the identity cache, and g.user only
+    loads the full User row for views that actually touch it. Assigning g.user
+    or g.user_id resets whatever was derived from the previous user.
+    """
+
+    def __setattr__(self, name, value):
+        # _AppCtxGlobals writes attributes straight into __dict__, which would skip the user setter
+        if name == 'user':
+            object.__setattr__(self, name, value)
+            return
+        if name == 'user_id':
+            self.__dict__.pop('_user', None)
+            self.__dict__.pop('_identity', None)
+        super().__setattr__(name, value)
+
+    @property
+    def user(self):
+        if '_user' not in self.__dict__:
+            user_id = self.__dict__.get('user_id')
+            self.__dict__['_user'] = User.query.get(user_id) if user_id is not None else None
+        return self.__dict__['_user']
+
+    @user.setter
+    def user(self, value):
+        self.__dict__['_user'] = value
+        self.__dict__['user_id'] = value.id if value is not None else None
+        self.__dict__.pop('_identity', None)
+
+    @property
+    def identity(self):
+        if '_identity' not in self.__dict__:
+            user_id = self.__dict__.get('user_id')
+            self.__dict__['_identity'] = get_identity(user_id) if user_id is not None else None
+        return self.__dict__['_identity']
+
+def init_app(app):
+    global _identity_cache
+    _identity_cache = LRUCache(app.config.get('USER_CACHE_SIZE', 4096), app.config.get('USER_CACHE_TTL', 30))
+    app.app_ctx_globals_class = RequestGlobals
+    app.before_request(load_logged_in_user)
+
+def get_identity(user_id):
+    """Return the cached Identity for user_id, or None if the user doesn't exist"""
+    identity = _identity_cache.get(user_id)
+    if identity is None:
+        # A short-lived connection, so the request's session doesn't hold one through a slow engine call
+        with db.engine.connect() as conn:
+            row = conn.execute(select(User.id, User.is_paid).where(User.id == user_id)).first()
+        if row is None:
+            return None
+        identity = Identity(row.id, bool(row.is_paid))
+        _identity_cache.set(user_id, identity)
+    return identity
+
+def invalidate_identity(user_id):
+    _identity_cache.delete(user_id)
+
+@event.listens_for(User, 'after_update')
+def _invalidate_on_update(mapper, connection, target):
+    if inspect(target).attrs.is_paid.history.has_changes():
+        invalidate_identity(target.id)
+
+@event.listens_for(User, 'after_delete')
+def _invalidate_on_delete(mapper, connection, target):
+    invalidate_identity(target.id)
+
 def load_logged_in_user():
+    """Resolve the caller's user id; the user itself is loaded on first access"""
+    with timed_stage('auth'):
+        g.user_id = _resolve_user_id()
+
+def _resolve_user_id():
     user_id = session.get('user_id')
-    
+
     # Try to get user from session first
     if user_id is not None:
-        g.user = User.query.get(user_id)
-        return
-        
+        return user_id
+
     # Then try token-based auth
     token = request.headers.get('X-API-Token')
     if token:
         user_id = validate_token(token)
         if user_id:
-            g.user = User.query.get(user_id)
-            return
-            
-    g.user = None
+            return user_id
+
+    return None
 
 def login_required(view):
     @wraps(view)
     def wrapped_view(*args, **kwargs):
-        if g.user is None:
+        with timed_stage('auth'):
+            identity = g.identity
+        if identity is None:
             return jsonify({'error': 'Authentication required'}), 401
         return view(*args, **kwargs)
     return wrapped_view
@@ -34,21 +118,15 @@ def login_required(view):
 def check_rate_limit(view):
     @wraps(view)
     def wrapped_view(*args, **kwargs):
-        if g.user is None:
+        if g.identity is None:
             return jsonify({'error': 'Authentication required'}), 401
-            
-        now = datetime.utcnow()
-        limit = app.config['RATE_LIMIT_PAID'] if g.user.is_paid else app.config['RATE_LIMIT_DEFAULT']
-        
-        # Reset count if it's been more than an hour
-        if g.user.last_request_time and g.user.last_request_time < now - timedelta(hours=1):
-            g.user.request_count = 0
-            
-        if g.user.request_count >= limit:
-            return jsonify({'error': 'Rate limit exceeded'}), 429
-            
-        g.user.request_count += 1
-        g.user.last_request_time = now
-        
-        return view(*args, **kwargs)
-    return wrapped_view
\ No newline at end of file
+
+        with timed_stage('rate_limit'):
+            result = rate_limiter.consume(g.identity.id, rate_limiter.limit_for(g.identity))
+        if not result.allowed:
+            return jsonify({'error': 'Rate limit exceeded'}), 429, rate_limit_headers(result)
+
+        response = make_response(view(*args, **kwargs))
+        response.headers.extend(rate_limit_headers(result))
+        return response
+    return wrapped_view
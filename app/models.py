@@ -1,5 +1,26 @@
+import zlib
 from datetime import datetime
-from . import db, bcrypt
+from flask import current_app, has_app_context
+from sqlalchemy.orm import deferred
+from sqlalchemy.types import LargeBinary, TypeDecorator
+from . import db
+from .utils.hashing import password_hasher
+
+class CompressedText(TypeDecorator):
+    """Text stored zlib-compressed in a binary column"""
+    impl = LargeBinary
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        level = current_app.config.get('COMPRESSION_LEVEL', 6) if has_app_context() else 6
+        return zlib.compress(value.encode('utf-8'), level)
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        return zlib.decompress(value).decode('utf-8')
 
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -7,23 +28,98 @@ class User(db.Model):
     password_hash = db.Column(db.String(128), nullable=False)
     is_paid = db.Column(db.Boolean, default=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Legacy rate limit counters; limits are now tracked in rate_limit_bucket
     request_count = db.Column(db.Integer, default=0)
     last_request_time = db.Column(db.DateTime)
 
     generations = db.relationship('Generation', backref='user', lazy=True)
 
     def check_password(self, password):
-        return bcrypt.check_password_hash(self.password_hash, password)
+        return password_hasher.check(self.password_hash, password)
 
     def set_password(self, password):
-        self.password_hash = bcrypt.generate_password_hash(password).decode('utf-8')
+        self.password_hash = password_hasher.hash(password)
+
+    def password_needs_rehash(self):
+        """True when the stored hash uses a different bcrypt cost than BCRYPT_LOG_ROUNDS"""
+        return password_hasher.needs_rehash(self.password_hash)
 
 class Generation(db.Model):
+    __table_args__ = (
+        # Serves per-user history ordered by recency, including keyset pagination
+        db.Index('ix_generation_user_created', 'user_id', 'created_at', 'id'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     niche = db.Column(db.String(100))
     content_type = db.Column(db.String(100))
     engine = db.Column(db.String(50))
     language = db.Column(db.String(10))
+    # The generated text lives in exactly one of these; use the `response` property
+    _response = db.Column('response', db.Text)
+    response_compressed = deferred(db.Column(CompressedText))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    @property
+    def response(self):
+        if self._response is not None:
+            return self._response
+        # Only compressed rows pay for loading (and inflating) the deferred column
+        return self.response_compressed
+
+    @response.setter
+    def response(self, value):
+        if has_app_context() and current_app.config.get('COMPRESS_RESPONSES'):
+            self.response_compressed = value
+            self._response = None
+        else:
+            self._response = value
+
+    @classmethod
+    def response_columns(cls):
+        """Columns to load when a query needs the response text"""
+        if has_app_context() and current_app.config.get('COMPRESS_RESPONSES'):
+            return [cls._response, cls.response_compressed]
+        return [cls._response]
+
+class CachedResponse(db.Model):
+    key = db.Column(db.String(64), primary_key=True)  # sha256 of engine, model, prompt and language
+    engine = db.Column(db.String(50))
+    model = db.Column(db.String(100))
+    language = db.Column(db.String(10))
     response = db.Column(db.Text)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
\ No newline at end of file
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+class ApiToken(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    token_hash = db.Column(db.String(64), unique=True, nullable=False, index=True)  # sha256 of the issued token
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+class RateLimitBucket(db.Model):
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    tokens = db.Column(db.Float, nullable=False)      # tokens left as of updated_at
+    updated_at = db.Column(db.Float, nullable=False)  # unix timestamp of the last refill
+
+class GenerationJob(db.Model):
+    """Status and result of a background generation, readable from every worker"""
+    id = db.Column(db.String(32), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    status = db.Column(db.String(20), nullable=False)  # queued, running, succeeded, failed or cancelled
+    result = db.Column(db.JSON)
+    error = db.Column(db.Text)
+    cancel_requested = db.Column(db.Boolean, nullable=False, default=False)  # checked by the running job
+    owner = db.Column(db.String(100))   # worker process the job runs on
+    heartbeat_at = db.Column(db.Float)  # refreshed by the owner while the job is unfinished
+    created_at = db.Column(db.Float, nullable=False)  # unix timestamps, as returned by the jobs API
+    started_at = db.Column(db.Float)
+    finished_at = db.Column(db.Float, index=True)
+
+class ServerSession(db.Model):
+    """Browser session data for SESSION_BACKEND=sqlalchemy"""
+    id = db.Column(db.Integer, primary_key=True)
+    session_id = db.Column(db.String(64), unique=True, nullable=False, index=True)  # sha256 of the cookie value
+    data = db.Column(db.Text, nullable=False)                 # tagged JSON, as in Flask's cookie sessions
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
@@ -1,14 +1,14 @@
 from flask import Blueprint, request, jsonify, session, current_app
 from app.models import User
-from app import db, bcrypt
-import secrets
+from app import db
+from app.utils.hashing import HashingBusy
+from app.utils.token_store import token_manager
 import traceback
 
 bp = Blueprint('auth', __name__, url_prefix='/auth')
 
-# In-memory token store (not persistent across restarts)
-# In a production app, you'd store this in Redis or a database
-tokens = {}
+def _busy_response(error):
+    return jsonify({'error': str(error)}), 503, {'Retry-After': str(error.retry_after)}
 
 @bp.route('/register', methods=['POST'])
 def register():
@@ -32,6 +32,9 @@ def register():
         db.session.commit()
 
         return jsonify({'message': 'User registered successfully'})
+    except HashingBusy as e:
+        db.session.rollback()
+        return _busy_response(e)
     except Exception as e:
         current_app.logger.error(f"Registration error: {str(e)}")
         db.session.rollback()
@@ -52,9 +55,16 @@ def login():
         if not user or not user.check_password(password):
             return jsonify({'error': 'Invalid credentials'}), 401
 
-        # Generate API token
-        token = secrets.token_urlsafe(32)
-        tokens[token] = user.id
+        # Upgrade hashes made with a different BCRYPT_LOG_ROUNDS while we have the password
+        if user.password_needs_rehash():
+            try:
+                user.set_password(password)
+                db.session.commit()
+            except HashingBusy:
+                db.session.rollback()  # The next login will try again
+
+        # Generate API token (shared by all workers via the configured token store)
+        token = token_manager.issue(user.id)
         
         # Still set session for browser clients
         session['user_id'] = user.id
@@ -62,11 +72,14 @@ def login():
         return jsonify({
             'message': 'Logged in successfully',
             'token': token,  # Return token for API usage
+            'expires_in': token_manager.ttl,
             'user': {
                 'email': user.email,
                 'is_paid': user.is_paid
             }
         })
+    except HashingBusy as e:
+        return _busy_response(e)
     except Exception as e:
         current_app.logger.error(f"Login error: {str(e)}")
         return jsonify({'error': 'Login failed'}), 500
@@ -75,14 +88,17 @@ def login():
 def logout():
     # Clear session
     session.clear()
+    response = jsonify({'message': 'Logged out successfully'})
     
     # Clear token if provided
     token = request.headers.get('X-API-Token')
-    if token and token in tokens:
-        del tokens[token]
+    if token:
+        token_manager.revoke(token)
+        # Token requests get a throwaway session, so end the cookie's stored one directly
+        current_app.session_interface.end_session(current_app, request, response)
         
-    return jsonify({'message': 'Logged out successfully'})
+    return response
 
 # Add a function to validate tokens
 def validate_token(token):
-    return tokens.get(token)
\ No newline at end of file
+    return token_manager.validate(token)
\ No newline at end of file
@@ -1,8 +1,26 @@
-from flask import Blueprint, request, jsonify, current_app
+import base64
+import csv
+import hashlib
+import io
+import json
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from flask import Blueprint, Response, request, jsonify, current_app, g, stream_with_context, url_for
+from sqlalchemy import func, or_, select, tuple_
+from sqlalchemy.orm import load_only
 from app.models import Generation
-from app import db
-from app.utils.translate import translate_to_bangla
-from app.utils.ollama_client import generate_content
+from app import db, job_queue, response_cache
+from app.utils.catalogue import catalogue
+from app.utils.engine_router import engine_router
+from app.utils.jobs import QueueFullError
+from app.utils.metrics import timed_stage
+from app.utils.rate_limit import rate_limiter, rate_limit_headers
+from app.utils.search import highlight_text, search_index
+from app.utils.singleflight import single_flight
+from app.utils.translate import TranslationError, translate_to_bangla
+from app.utils.ollama_client import EngineError, get_model_name
 from app.middleware.auth_middleware import login_required, check_rate_limit
 
 bp = Blueprint('generate', __name__, url_prefix='/generate')
@@ -16,25 +34,156 @@ TEMPLATES = {
     "SEO Article": "Write an SEO-optimized article about '{niche}' with proper headings, subheadings, and keywords naturally incorporated."
 }
 
-# Load category data from file
-def load_category_data():
-    try:
-        with open('app/data/full_clothing_combinations.txt', 'r') as file:
-            categories = [line.strip() for line in file.readlines() if line.strip()]
-        return categories
-    except Exception as e:
-        current_app.logger.error(f"Error loading category data: {str(e)}")
-        return []
-    
+@bp.route('/categories', methods=['GET'])
 def get_categories():
-    """Endpoint to get all clothing categories"""
+    """Endpoint to get clothing categories, optionally filtered by ?prefix= and ?q=
+
+    ?format=tree returns the nested hierarchy instead of a flat list of paths.
+    Responses carry an ETag so clients can revalidate with If-None-Match.
+    """
     try:
-        categories = load_category_data()
-        return jsonify(categories)
+        prefix = request.args.get('prefix', '').strip()
+        q = request.args.get('q', '').strip()
+        as_tree = request.args.get('format') == 'tree'
+
+        if as_tree:
+            payload = catalogue.tree(prefix or None)
+        else:
+            payload = catalogue.search(prefix or None, q or None)
+
+        response = jsonify(payload)
+        if catalogue.etag:
+            response.set_etag(f"{catalogue.etag}-{hashlib.sha1(request.query_string).hexdigest()[:12]}")
+        response.cache_control.public = True
+        response.cache_control.max_age = current_app.config.get('CATEGORY_CACHE_MAX_AGE', 3600)
+        return response.make_conditional(request)
     except Exception as e:
         current_app.logger.error(f"Error retrieving categories: {str(e)}")
         return jsonify({'error': 'Failed to retrieve categories'}), 500
 
+def _parse_generation_request(data):
+    """Validate a generation request body and build its niche and prompt
+
+    Returns a tuple of (params, error) where error is a message for a 400 response
+    """
+    categories = data.get('categories', [])
+    color = data.get('color', '')
+    additional_words = data.get('additionalWords', '')
+    content_type = data.get('type', 'Product Description')
+    engine = data.get('engine', 'openai')
+    language = data.get('language', 'en')
+
+    if not categories:
+        return None, 'No clothing categories provided'
+
+    if not isinstance(categories, list) or not all(isinstance(category, str) for category in categories):
+        return None, 'Categories must be a list of strings'
+
+    if current_app.config.get('CATEGORY_VALIDATION', True) and catalogue.loaded:
+        unknown = [category for category in categories if not catalogue.contains(category)]
+        if unknown:
+            return None, f'Unknown clothing categories: {", ".join(unknown)}'
+
+    if not color:
+        return None, 'No primary color provided'
+
+    if content_type not in TEMPLATES:
+        return None, f'Unknown content type. Available types: {", ".join(TEMPLATES.keys())}'
+
+    # Build the niche description from the selected categories
+    categories_str = ", ".join(categories)
+    additional_words_formatted = additional_words.strip()
+
+    niche = f"{color} {categories_str}"
+    if additional_words_formatted:
+        keywords = [word.strip() for word in additional_words_formatted.split(',')[:5]]
+        if keywords:
+            niche += f" with these keywords: {', '.join(keywords)}"
+
+    return {
+        'niche': niche,
+        'prompt': TEMPLATES.get(content_type).format(niche=niche),
+        'content_type': content_type,
+        'engine': engine,
+        'language': language
+    }, None
+
+def _save_generation(user_id, params, content, engine=None):
+    """Persist a finished generation for a user, recording the engine that produced it"""
+    generation = Generation(
+        user_id=user_id,
+        niche=params['niche'],
+        content_type=params['content_type'],
+        engine=engine or params['engine'],
+        language=params['language'],
+        response=content
+    )
+    db.session.add(generation)
+    with timed_stage('db_commit'):
+        db.session.commit()
+    return generation
+
+def _cache_key(params, engine=None):
+    engine = engine_router.normalize(engine or params['engine'])
+    return response_cache.make_key(engine, get_model_name(engine), params['prompt'], params['language'])
+
+def _cache_store(params, engine, content):
+    response_cache.set(_cache_key(params, engine), content, engine, get_model_name(engine), params['language'])
+
+def _engine_error_response(error):
+    """JSON error response for an EngineError, with Retry-After when the engine said when to retry"""
+    headers = {'Retry-After': str(error.retry_after)} if error.retry_after else {}
+    return jsonify({'error': str(error)}), error.status_code, headers
+
+def _generate_fresh(params, engine):
+    """Run the engine (and translation) for a request and cache the result; returns (content, engine)"""
+    content, engine = engine_router.generate(engine, params['prompt'])
+
+    if params['language'] == 'bn':
+        try:
+            with timed_stage('translation'):
+                content = translate_to_bangla(content, raise_errors=True)
+        except TranslationError as e:
+            e.content = content
+            raise
+
+    _cache_store(params, engine, content)
+    return content, engine
+
+def _produce_content(params, bypass_cache=False):
+    """Return (content, cached, engine) for a request, consulting the response cache first
+
+    On a miss, identical concurrent requests are coalesced so only one of them
+    calls the engine; the others get its result with cached set. engine is the
+    one that produced the content, which differs from the requested engine
+    after a failover. Engine failures raise EngineError and translation
+    failures raise TranslationError, so neither is ever cached or saved.
+    """
+    engine = engine_router.normalize(params['engine'])
+    if bypass_cache:
+        response_cache.record_bypass()
+        content, engine = _generate_fresh(params, engine)
+        return content, False, engine
+
+    key = _cache_key(params, engine)
+    content = response_cache.get(key)
+    if content is not None:
+        return content, True, engine
+
+    def recheck():
+        # After a failover the leader stored its result under the engine that actually ran
+        for candidate in engine_router.candidates(engine):
+            content = response_cache.get(_cache_key(params, candidate))
+            if content is not None:
+                return content, candidate
+        return None
+
+    # Other workers can only hand over their result through the shared cache table
+    (content, engine), shared = single_flight.do(
+        key, lambda: _generate_fresh(params, engine), recheck if response_cache.persistent else None
+    )
+    return content, shared, engine
+
 @bp.route('/', methods=['POST'])
 @login_required
 @check_rate_limit
@@ -43,92 +192,631 @@ def generate_content_endpoint():
         data = request.get_json()
         if not data:
             return jsonify({'error': 'No data provided'}), 400
-            
-        # Extract data from the request
-        categories = data.get('categories', [])
-        color = data.get('color', '')
-        additional_words = data.get('additionalWords', '')
-        content_type = data.get('type', 'Product Description')
-        engine = data.get('engine', 'openai')
-        language = data.get('language', 'en')
-
-        if not categories:
-            return jsonify({'error': 'No clothing categories provided'}), 400
-            
-        if not color:
-            return jsonify({'error': 'No primary color provided'}), 400
-            
-        if content_type not in TEMPLATES:
-            return jsonify({'error': f'Unknown content type. Available types: {", ".join(TEMPLATES.keys())}'}), 400
-
-        # Build the niche description from the selected categories
-        categories_str = ", ".join(categories)
-        additional_words_formatted = additional_words.strip()
-        
-        niche = f"{color} {categories_str}"
-        if additional_words_formatted:
-            keywords = [word.strip() for word in additional_words_formatted.split(',')[:5]]
-            if keywords:
-                niche += f" with these keywords: {', '.join(keywords)}"
-        
-        # Generate content based on the niche
-        prompt = TEMPLATES.get(content_type).format(niche=niche)
-        content = generate_content(engine, prompt)
 
-        # Translate if needed
-        if language == 'bn':
-            try:
-                content = translate_to_bangla(content)
-            except Exception as e:
-                current_app.logger.error(f"Translation error: {str(e)}")
-                return jsonify({'error': 'Translation failed', 'content': content}), 500
+        with timed_stage('prompt_build'):
+            params, error = _parse_generation_request(data)
+        if error:
+            return jsonify({'error': error}), 400
+
+        if data.get('async'):
+            return _enqueue_generation(params, data.get('bypass_cache', False))
+
+        # Generate (and translate if needed) content, reusing an identical earlier result
+        try:
+            content, cached, engine = _produce_content(params, data.get('bypass_cache', False))
+        except EngineError as e:
+            # Nothing was generated, so nothing is saved and the request isn't charged
+            rate_limiter.refund(g.identity.id)
+            return _engine_error_response(e)
+        except TranslationError as e:
+            return jsonify({'error': 'Translation failed', 'content': e.content}), 500
 
         # Save generation
-        from flask import g
-        generation = Generation(
-            user_id=g.user.id,
-            niche=niche,
-            content_type=content_type,
-            engine=engine,
-            language=language,
-            response=content
-        )
-        db.session.add(generation)
-        db.session.commit()
+        _save_generation(g.identity.id, params, content, engine)
 
-        return jsonify({"content": content})
+        return jsonify({"content": content, "cached": cached, "engine": engine})
         
     except Exception as e:
         current_app.logger.error(f"Generation error: {str(e)}")
         db.session.rollback()
         return jsonify({'error': 'Content generation failed'}), 500
 
+def _run_generation_job(job, user_id, params, bypass_cache=False):
+    """Generate, translate and save content from a background worker"""
+    try:
+        content, cached, engine = _produce_content(params, bypass_cache)
+    except EngineError:
+        rate_limiter.refund(user_id)
+        raise
+    job.check_cancelled()
+
+    try:
+        generation = _save_generation(user_id, params, content, engine)
+    except Exception:
+        db.session.rollback()
+        raise
+    return {'id': generation.id, 'content': content, 'cached': cached, 'engine': engine}
+
+def _enqueue_generation(params, bypass_cache=False):
+    """Hand a validated request to the job queue and reply with its job id"""
+    try:
+        job = job_queue.submit(
+            current_app._get_current_object(), g.identity.id, _run_generation_job, g.identity.id, params, bypass_cache
+        )
+    except QueueFullError:
+        # The request never ran, so don't count it against the user's limit
+        rate_limiter.refund(g.identity.id)
+        return jsonify({'error': 'Generation queue is full, please retry shortly'}), 503, {'Retry-After': '5'}
+
+    status_url = url_for('generate.get_job', job_id=job.id)
+    return jsonify({'job_id': job.id, 'status': job.status, 'status_url': status_url}), 202, {'Location': status_url}
+
+@bp.route('/jobs/<job_id>', methods=['GET'])
+@login_required
+def get_job(job_id):
+    job = job_queue.get(job_id)
+    if job is None or job.user_id != g.identity.id:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job.to_dict())
+
+@bp.route('/jobs/<job_id>', methods=['DELETE'])
+@login_required
+def cancel_job(job_id):
+    job = job_queue.get(job_id)
+    if job is None or job.user_id != g.identity.id:
+        return jsonify({'error': 'Job not found'}), 404
+    if not job_queue.cancel(job_id):
+        return jsonify({'error': f'Job already {job_queue.get(job_id).status}'}), 409
+    return jsonify(job_queue.get(job_id).to_dict())
+
+_batch_semaphores = {}
+_batch_semaphores_lock = threading.Lock()
+_batch_executor = None
+
+def _batch_semaphore(engine):
+    """Per-worker cap on concurrent batch calls to one engine"""
+    with _batch_semaphores_lock:
+        semaphore = _batch_semaphores.get(engine)
+        if semaphore is None:
+            key = 'BATCH_CONCURRENCY_OLLAMA' if engine == 'ollama' else 'BATCH_CONCURRENCY_OPENAI'
+            semaphore = threading.BoundedSemaphore(current_app.config.get(key, 4))
+            _batch_semaphores[engine] = semaphore
+        return semaphore
+
+def _get_batch_executor():
+    """Per-worker thread pool shared by every batch request"""
+    global _batch_executor
+    with _batch_semaphores_lock:
+        if _batch_executor is None:
+            _batch_executor = ThreadPoolExecutor(
+                max_workers=current_app.config.get('BATCH_MAX_WORKERS', 16),
+                thread_name_prefix='generation-batch'
+            )
+        return _batch_executor
+
+def _run_batch_item(app, index, params, bypass_cache):
+    """Produce one batch item inside its own app context; failures are reported, not raised"""
+    with app.app_context():
+        try:
+            with _batch_semaphore(engine_router.normalize(params['engine'])):
+                content, cached, engine = _produce_content(params, bypass_cache)
+            return {'index': index, 'niche': params['niche'], 'content': content, 'cached': cached, 'engine': engine}
+        except EngineError as e:
+            item = {'index': index, 'niche': params['niche'], 'error': str(e)}
+            if e.retry_after:
+                item['retry_after'] = e.retry_after
+            return item
+        except TranslationError:
+            return {'index': index, 'niche': params['niche'], 'error': 'Translation failed'}
+        except Exception as e:
+            app.logger.error(f"Batch item {index} error: {str(e)}")
+            return {'index': index, 'niche': params['niche'], 'error': 'Content generation failed'}
+
+def _save_batch(user_id, items, results, unfinished=0):
+    """Insert every successful batch result in one transaction
+
+    Failed items, and the `unfinished` ones that never produced a result, are
+    refunded.
+    """
+    generations = {}
+    for result in results:
+        if 'error' not in result:
+            generations[result['index']] = Generation(
+                user_id=user_id,
+                niche=items[result['index']]['niche'],
+                content_type=items[result['index']]['content_type'],
+                engine=result['engine'],
+                language=items[result['index']]['language'],
+                response=result['content']
+            )
+    if generations:
+        db.session.add_all(generations.values())
+        with timed_stage('db_commit'):
+            db.session.commit()
+    for result in results:
+        if result['index'] in generations:
+            result['id'] = generations[result['index']].id
+
+    failed = len(results) - len(generations) + unfinished
+    if failed:
+        rate_limiter.refund(user_id, failed)
+
+@bp.route('/batch', methods=['POST'])
+@login_required
+def generate_batch_endpoint():
+    """Generate content for many niches concurrently
+
+    Body: {"items": [<generation request>, ...]} plus optional batch-wide
+    "type", "engine", "language", "bypass_cache" and "stream". Each item costs
+    one rate limit token; failed items are refunded. If a streaming client
+    disconnects, items that haven't started are dropped, finished ones are
+    saved and the rest are refunded.
+    """
+    data = request.get_json(silent=True)
+    if not data:
+        return jsonify({'error': 'No data provided'}), 400
+
+    raw_items = data.get('items') or []
+    if not isinstance(raw_items, list) or not raw_items:
+        return jsonify({'error': 'No batch items provided'}), 400
+
+    max_items = current_app.config.get('BATCH_MAX_ITEMS', 50)
+    if len(raw_items) > max_items:
+        return jsonify({'error': f'Too many batch items (maximum {max_items})'}), 400
+
+    defaults = {key: data[key] for key in ('type', 'engine', 'language') if key in data}
+    items = []
+    errors = []
+    for index, raw in enumerate(raw_items):
+        if not isinstance(raw, dict):
+            errors.append({'index': index, 'error': 'Batch items must be objects'})
+            continue
+        params, error = _parse_generation_request({**defaults, **raw})
+        if error:
+            errors.append({'index': index, 'error': error})
+        items.append(params)
+    if errors:
+        return jsonify({'error': 'Invalid batch items', 'items': errors}), 400
+
+    with timed_stage('rate_limit'):
+        result = rate_limiter.consume(g.identity.id, rate_limiter.limit_for(g.identity), cost=len(items))
+    headers = rate_limit_headers(result)
+    if not result.allowed:
+        return jsonify({'error': 'Rate limit exceeded'}), 429, headers
+
+    app = current_app._get_current_object()
+    user_id = g.identity.id
+    bypass_cache = data.get('bypass_cache', False)
+
+    def run():
+        executor = _get_batch_executor()
+        return [executor.submit(_run_batch_item, app, index, params, bypass_cache)
+                for index, params in enumerate(items)]
+
+    if data.get('stream'):
+        def generate():
+            futures = run()
+            results = []
+            try:
+                for future in as_completed(futures):
+                    item = future.result()
+                    results.append(item)
+                    yield json.dumps({'type': 'item', **item}) + "\n"
+            except GeneratorExit:
+                # The client went away: don't start the remaining items, keep the finished ones
+                for future in futures:
+                    future.cancel()
+                finished = [future.result() for future in futures if future.done() and not future.cancelled()]
+                try:
+                    _save_batch(user_id, items, finished, unfinished=len(items) - len(finished))
+                except Exception as e:
+                    current_app.logger.error(f"Batch save error: {str(e)}")
+                    db.session.rollback()
+                raise
+            try:
+                _save_batch(user_id, items, results)
+                yield json.dumps({'type': 'done', 'ids': [r['id'] for r in results if 'id' in r]}) + "\n"
+            except Exception as e:
+                current_app.logger.error(f"Batch save error: {str(e)}")
+                db.session.rollback()
+                yield json.dumps({'type': 'error', 'error': 'Failed to save batch results'}) + "\n"
+
+        return Response(
+            stream_with_context(generate()),
+            mimetype='application/x-ndjson',
+            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no', **headers}
+        )
+
+    results = sorted((future.result() for future in run()), key=lambda item: item['index'])
+    try:
+        _save_batch(user_id, items, results)
+    except Exception as e:
+        current_app.logger.error(f"Batch save error: {str(e)}")
+        db.session.rollback()
+        return jsonify({'error': 'Failed to save batch results'}), 500, headers
+
+    return jsonify({'results': results}), 200, headers
+
+@bp.route('/stream', methods=['POST'])
+@login_required
+@check_rate_limit
+def stream_content_endpoint():
+    """Stream generated content as NDJSON events while the engine produces it
+
+    Emits {"type": "token"} events for each chunk, then a single {"type": "done"}
+    event carrying the final (possibly translated) content, or {"type": "error"}.
+    """
+    data = request.get_json(silent=True)
+    if not data:
+        return jsonify({'error': 'No data provided'}), 400
+
+    with timed_stage('prompt_build'):
+        params, error = _parse_generation_request(data)
+    if error:
+        return jsonify({'error': error}), 400
+
+    def _event(payload):
+        return json.dumps(payload) + "\n"
+
+    engine = engine_router.normalize(params['engine'])
+    bypass_cache = data.get('bypass_cache', False)
+    if bypass_cache:
+        response_cache.record_bypass()
+        cached_content = None
+    else:
+        cached_content = response_cache.get(_cache_key(params, engine))
+
+    def generate():
+        chunks = []
+        stream = None
+        try:
+            if cached_content is not None:
+                yield _event({'type': 'token', 'content': cached_content})
+                generation = _save_generation(g.identity.id, params, cached_content, engine)
+                yield _event({'type': 'done', 'id': generation.id, 'content': cached_content, 'cached': True, 'engine': engine})
+                return
+
+            stream = engine_router.open_stream(engine, params['prompt'])
+            for token in stream:
+                chunks.append(token)
+                yield _event({'type': 'token', 'content': token})
+
+            content = "".join(chunks)
+            if params['language'] == 'bn':
+                try:
+                    with timed_stage('translation'):
+                        content = translate_to_bangla(content, raise_errors=True)
+                except TranslationError:
+                    yield _event({'type': 'error', 'error': 'Translation failed', 'content': content})
+                    return
+
+            _cache_store(params, stream.engine, content)
+            generation = _save_generation(g.identity.id, params, content, stream.engine)
+            yield _event({'type': 'done', 'id': generation.id, 'content': content, 'cached': False, 'engine': stream.engine})
+        except EngineError as e:
+            db.session.rollback()
+            if not chunks:
+                rate_limiter.refund(g.identity.id)
+            event = {'type': 'error', 'error': str(e)}
+            if e.retry_after:
+                event['retry_after'] = e.retry_after
+            yield _event(event)
+        except Exception as e:
+            current_app.logger.error(f"Streaming generation error: {str(e)}")
+            db.session.rollback()
+            yield _event({'type': 'error', 'error': 'Content generation failed'})
+        finally:
+            if stream is not None:
+                stream.close()
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='application/x-ndjson',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@bp.route('/cache/stats', methods=['GET'])
+@login_required
+def get_cache_stats():
+    return jsonify(response_cache.stats())
+
+HISTORY_FIELDS = ('id', 'niche', 'content_type', 'engine', 'language', 'created_at', 'response')
+
+def _serialize_generation(gen, fields=HISTORY_FIELDS):
+    item = {}
+    for field in fields:
+        value = getattr(gen, field)
+        item[field] = value.isoformat() if field == 'created_at' and value else value
+    return item
+
+def _parse_history_fields(args):
+    """Return (fields, error) for the ?fields= column selection"""
+    fields = args.get('fields')
+    fields = [field.strip() for field in fields.split(',') if field.strip()] if fields else list(HISTORY_FIELDS)
+    unknown = [field for field in fields if field not in HISTORY_FIELDS]
+    if unknown:
+        return None, f'Unknown fields: {", ".join(unknown)}. Available fields: {", ".join(HISTORY_FIELDS)}'
+    return fields, None
+
+def _encode_cursor(gen):
+    raw = f"{gen.created_at.isoformat()}|{gen.id}"
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+def _decode_cursor(cursor):
+    created_at, gen_id = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8').split('|')
+    return datetime.fromisoformat(created_at), int(gen_id)
+
 @bp.route('/history', methods=['GET'])
 @login_required
 def get_history():
+    """List the current user's generations, newest first
+
+    Uses keyset pagination: pass the returned next_cursor as ?cursor= to get
+    the next page of ?limit= items. ?fields= picks which columns to return
+    (omit response for list views), and ?count=false skips the total count.
+    Passing ?page= keeps the older offset pagination.
+    """
     try:
-        from flask import g
-        page = request.args.get('page', 1, type=int)
-        per_page = request.args.get('per_page', 10, type=int)
-        
-        generations = Generation.query.filter_by(user_id=g.user.id) \
-            .order_by(Generation.created_at.desc()) \
-            .paginate(page=page, per_page=per_page)
-            
+        fields, error = _parse_history_fields(request.args)
+        if error:
+            return jsonify({'error': error}), 400
+
+        include_count = request.args.get('count', 'true').lower() != 'false'
+        max_per_page = current_app.config.get('HISTORY_MAX_PER_PAGE', 100)
+
+        # Only load the requested columns, plus what the cursor needs
+        columns = [getattr(Generation, field) for field in set(fields) | {'id', 'created_at'} if field != 'response']
+        if 'response' in fields:
+            columns += Generation.response_columns()
+        query = Generation.query.filter_by(user_id=g.identity.id) \
+            .options(load_only(*columns))
+
+        if 'page' in request.args:
+            page = request.args.get('page', 1, type=int)
+            per_page = min(request.args.get('per_page', 10, type=int), max_per_page)
+
+            generations = query.order_by(Generation.created_at.desc(), Generation.id.desc()) \
+                .paginate(page=page, per_page=per_page, count=include_count)
+
+            return jsonify({
+                'items': [_serialize_generation(gen, fields) for gen in generations.items],
+                'total': generations.total,
+                'pages': generations.pages if include_count else None,
+                'current_page': page
+            })
+
+        limit = max(1, min(request.args.get('limit', request.args.get('per_page', 10, type=int), type=int), max_per_page))
+        cursor = request.args.get('cursor')
+        if cursor:
+            try:
+                created_at, gen_id = _decode_cursor(cursor)
+            except (ValueError, UnicodeDecodeError):
+                return jsonify({'error': 'Invalid cursor'}), 400
+            query = query.filter(tuple_(Generation.created_at, Generation.id) < tuple_(created_at, gen_id))
+
+        generations = query.order_by(Generation.created_at.desc(), Generation.id.desc()) \
+            .limit(limit + 1) \
+            .all()
+        has_more = len(generations) > limit
+        generations = generations[:limit]
+
+        total = None
+        if include_count:
+            total = db.session.query(func.count(Generation.id)) \
+                .filter(Generation.user_id == g.identity.id) \
+                .scalar()
+
         return jsonify({
-            'items': [{
-                'id': gen.id,
-                'niche': gen.niche,
-                'content_type': gen.content_type,
-                'engine': gen.engine,
-                'language': gen.language,
-                'created_at': gen.created_at.isoformat(),
-                'response': gen.response
-            } for gen in generations.items],
-            'total': generations.total,
-            'pages': generations.pages,
-            'current_page': page
+            'items': [_serialize_generation(gen, fields) for gen in generations],
+            'next_cursor': _encode_cursor(generations[-1]) if has_more else None,
+            'has_more': has_more,
+            'total': total
         })
     except Exception as e:
         current_app.logger.error(f"History retrieval error: {str(e)}")
-        return jsonify({'error': 'Failed to retrieve history'}), 500
\ No newline at end of file
+        return jsonify({'error': 'Failed to retrieve history'}), 500
+
+EXPORT_FORMATS = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv'}
+
+def _parse_export_filters(args):
+    """Build SQL conditions from the export query string
+
+    Returns a tuple of (conditions, error) where error is a message for a 400 response
+    """
+    table = Generation.__table__
+    conditions = []
+    try:
+        if args.get('since'):
+            conditions.append(table.c.created_at >= datetime.fromisoformat(args['since']))
+        if args.get('until'):
+            conditions.append(table.c.created_at < datetime.fromisoformat(args['until']))
+    except ValueError:
+        return None, 'Invalid since/until; use an ISO 8601 date or datetime'
+    for param in ('content_type', 'engine', 'language'):
+        value = args.get(param)
+        if value:
+            conditions.append(table.c[param] == value)
+    return conditions, None
+
+@bp.route('/history/export', methods=['GET'])
+@login_required
+def export_history():
+    """Stream all of the current user's generations, oldest first
+
+    ?format= is ndjson (default) or csv and ?gzip=true compresses the download.
+    Filters: ?since= and ?until= (ISO 8601 created_at range, until exclusive),
+    ?content_type=, ?engine=, ?language=, plus ?fields= as for /history.
+    Rows are read through a server-side cursor in EXPORT_BATCH_SIZE chunks and
+    written out as they arrive, so memory stays flat however long the history is.
+    """
+    export_format = request.args.get('format', 'ndjson').lower()
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({'error': f'Unknown format. Available formats: {", ".join(EXPORT_FORMATS)}'}), 400
+
+    fields, error = _parse_history_fields(request.args)
+    if error:
+        return jsonify({'error': error}), 400
+
+    conditions, error = _parse_export_filters(request.args)
+    if error:
+        return jsonify({'error': error}), 400
+
+    table = Generation.__table__
+    columns = [table.c[field] for field in fields if field != 'response']
+    if 'response' in fields:
+        columns.extend([table.c.response, table.c.response_compressed])
+    query = select(*columns) \
+        .where(table.c.user_id == g.identity.id, *conditions) \
+        .order_by(table.c.created_at, table.c.id)
+
+    batch_size = current_app.config.get('EXPORT_BATCH_SIZE', 500)
+    compress = request.args.get('gzip', 'false').lower() == 'true'
+    compression_level = current_app.config.get('COMPRESSION_LEVEL', 6)
+
+    def row_values(row):
+        mapping = row._mapping
+        for field in fields:
+            if field == 'response':
+                value = mapping['response']
+                if value is None:
+                    value = mapping['response_compressed']
+            else:
+                value = mapping[field]
+            yield field, value.isoformat() if field == 'created_at' and value else value
+
+    def encode_rows():
+        if export_format == 'csv':
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(fields)
+
+        with db.engine.connect() as conn:
+            result = conn.execution_options(stream_results=True, yield_per=batch_size).execute(query)
+            for rows in result.partitions():
+                if export_format == 'csv':
+                    writer.writerows([value for _, value in row_values(row)] for row in rows)
+                    chunk = buffer.getvalue()
+                    buffer.seek(0)
+                    buffer.truncate()
+                else:
+                    chunk = ''.join(json.dumps(dict(row_values(row))) + "\n" for row in rows)
+                yield chunk.encode('utf-8')
+
+        if export_format == 'csv' and buffer.tell():
+            yield buffer.getvalue().encode('utf-8')
+
+    def generate():
+        if not compress:
+            yield from encode_rows()
+            return
+        # wbits=31 writes a gzip header and trailer around the deflate stream
+        compressor = zlib.compressobj(compression_level, zlib.DEFLATED, 31)
+        for chunk in encode_rows():
+            data = compressor.compress(chunk)
+            if data:
+                yield data
+        yield compressor.flush()
+
+    filename = f"history-{datetime.utcnow():%Y%m%d}.{export_format}" + ('.gz' if compress else '')
+    return Response(
+        stream_with_context(generate()),
+        mimetype='application/gzip' if compress else EXPORT_FORMATS[export_format],
+        headers={
+            'Content-Disposition': f'attachment; filename="{filename}"',
+            'Cache-Control': 'no-store',
+            'X-Accel-Buffering': 'no'
+        }
+    )
+
+def _scan_search(user_id, query, engine, language, limit, offset):
+    """LIKE search over one user's rows, for databases without a full-text index
+
+    Only the niche and the plain response column are matched: a LIKE can't see
+    into responses stored compressed (COMPRESS_RESPONSES), so on those rows the
+    fallback only finds niche matches.
+    """
+    conditions = [Generation.user_id == user_id]
+    for word in query.split():
+        pattern = '%' + word.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+        conditions.append(or_(
+            Generation.niche.ilike(pattern, escape='\\'),
+            Generation._response.ilike(pattern, escape='\\')
+        ))
+    if engine:
+        conditions.append(Generation.engine == engine)
+    if language:
+        conditions.append(Generation.language == language)
+    rows = db.session.query(Generation.id) \
+        .filter(*conditions) \
+        .order_by(Generation.created_at.desc(), Generation.id.desc()) \
+        .limit(limit) \
+        .offset(offset) \
+        .all()
+    return [(row.id, None, None, None) for row in rows]
+
+@bp.route('/search', methods=['GET'])
+@login_required
+def search_history():
+    """Full-text search over the current user's generations, best match first
+
+    ?q= is required; ?engine= and ?language= narrow the results and ?limit=
+    and ?offset= page through them. Matched words are wrapped in <mark> in the
+    returned niche and snippet.
+    """
+    try:
+        query = request.args.get('q', '').strip()
+        if not query:
+            return jsonify({'error': 'No search query provided'}), 400
+
+        limit = max(1, min(request.args.get('limit', 20, type=int), current_app.config.get('SEARCH_MAX_RESULTS', 50)))
+        offset = max(0, request.args.get('offset', 0, type=int))
+        engine = request.args.get('engine')
+        language = request.args.get('language')
+
+        with timed_stage('search'):
+            # Fetch one extra hit to know whether there's another page
+            hits = search_index.search(db.session.connection(), g.identity.id, query, engine, language, limit + 1, offset)
+            if hits is None:
+                hits = _scan_search(g.identity.id, query, engine, language, limit + 1, offset)
+        has_more = len(hits) > limit
+        hits = hits[:limit]
+
+        # Rows the index couldn't snippet (compressed responses, the LIKE fallback) need their text
+        columns = [Generation.id, Generation.niche, Generation.content_type, Generation.engine,
+                   Generation.language, Generation.created_at]
+        if any(not snippet for _, _, _, snippet in hits):
+            columns += Generation.response_columns()
+        generations = Generation.query \
+            .filter(Generation.id.in_([hit[0] for hit in hits]), Generation.user_id == g.identity.id) \
+            .options(load_only(*columns)) \
+            .all()
+        generations = {gen.id: gen for gen in generations}
+
+        items = []
+        for generation_id, score, niche, snippet in hits:
+            gen = generations.get(generation_id)
+            if gen is None:
+                continue  # Deleted since it was indexed
+            item = _serialize_generation(gen, ('id', 'content_type', 'engine', 'language', 'created_at'))
+            item['niche'] = niche or highlight_text(gen.niche, query)
+            item['snippet'] = snippet or highlight_text(gen.response, query, width=200)
+            item['score'] = score
+            items.append(item)
+
+        return jsonify({'items': items, 'has_more': has_more, 'next_offset': offset + limit if has_more else None})
+    except Exception as e:
+        current_app.logger.error(f"Search error: {str(e)}")
+        return jsonify({'error': 'Search failed'}), 500
+
+@bp.route('/history/<int:generation_id>', methods=['GET'])
+@login_required
+def get_history_item(generation_id):
+    """Return one generation, including its full response"""
+    try:
+        gen = Generation.query.filter_by(id=generation_id, user_id=g.identity.id).first()
+        if gen is None:
+            return jsonify({'error': 'Generation not found'}), 404
+        return jsonify(_serialize_generation(gen))
+    except Exception as e:
+        current_app.logger.error(f"History retrieval error: {str(e)}")
+        return jsonify({'error': 'Failed to retrieve history'}), 500
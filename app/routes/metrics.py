@@ -0,0 +1,17 @@
+from flask import Blueprint, Response, request, jsonify, current_app
+from app import job_queue
+from app.utils.metrics import registry
+
+bp = Blueprint('metrics', __name__)
+
+JOB_QUEUE_DEPTH = registry.gauge('nichegen_job_queue_depth', 'Background generation jobs queued or running')
+
+@bp.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Prometheus scrape endpoint for this worker's metrics"""
+    token = current_app.config.get('METRICS_TOKEN')
+    if token and request.headers.get('Authorization') != f"Bearer {token}":
+        return jsonify({'error': 'Authentication required'}), 401
+
+    JOB_QUEUE_DEPTH.set(job_queue.depth)
+    return Response(registry.render(), mimetype='text/plain; version=0.0.4')
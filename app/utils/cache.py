@@ -0,0 +1,209 @@
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from sqlalchemy.exc import IntegrityError
+from app.utils.metrics import CACHE_LOOKUPS
+from app.utils.purge import PeriodicPurge, delete_in_batches
+
+class LRUCache:
+    """Thread-safe least-recently-used cache with optional per-entry TTL"""
+
+    def __init__(self, maxsize=1024, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            value, expires_at = item
+            if expires_at is not None and expires_at < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+def _normalize_prompt(prompt):
+    """Collapse whitespace and case so trivially different prompts share an entry"""
+    return re.sub(r'\s+', ' ', prompt).strip().casefold()
+
+class ResponseCache:
+    """Content-addressed cache of finished generations
+
+    Entries are keyed on a hash of (engine, model, normalized prompt, language).
+    Lookups hit an in-memory LRU first and, when RESPONSE_CACHE_PERSISTENT is set,
+    fall back to the cached_response table so entries survive restarts and are
+    shared between workers. Expired rows are purged from that table in batches
+    every RESPONSE_CACHE_PURGE_INTERVAL seconds.
+    """
+
+    def __init__(self):
+        self.app = None
+        self.enabled = True
+        self.persistent = False
+        self.ttl = 86400
+        self.purge_batch_size = 500
+        self._memory = LRUCache()
+        self._lock = threading.Lock()
+        self._stats = {'memory_hits': 0, 'persistent_hits': 0, 'misses': 0, 'stores': 0, 'bypassed': 0}
+        self._purge = PeriodicPurge(self.purge_expired, 'expired cached responses')
+
+    def init_app(self, app):
+        self.app = app
+        self.enabled = app.config.get('RESPONSE_CACHE_ENABLED', True)
+        self.persistent = app.config.get('RESPONSE_CACHE_PERSISTENT', False)
+        self.ttl = app.config.get('RESPONSE_CACHE_TTL', self.ttl)
+        self._memory = LRUCache(app.config.get('RESPONSE_CACHE_SIZE', 1024), self.ttl)
+        self._purge = PeriodicPurge(
+            self.purge_expired, 'expired cached responses',
+            app.config.get('RESPONSE_CACHE_PURGE_INTERVAL', 3600), app.logger
+        )
+
+    @staticmethod
+    def make_key(engine, model, prompt, language):
+        raw = "\x1f".join([engine or '', model or '', _normalize_prompt(prompt), language or ''])
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        """Return cached content for key, or None on a miss"""
+        if not self.enabled:
+            return None
+
+        content = self._memory.get(key)
+        if content is not None:
+            self._count('memory_hits')
+            CACHE_LOOKUPS.inc(result='memory_hit')
+            return content
+
+        if self.persistent:
+            content = self._load_persistent(key)
+            if content is not None:
+                self._memory.set(key, content)
+                self._count('persistent_hits')
+                CACHE_LOOKUPS.inc(result='persistent_hit')
+                return content
+
+        self._count('misses')
+        CACHE_LOOKUPS.inc(result='miss')
+        return None
+
+    def set(self, key, content, engine=None, model=None, language=None):
+        if not self.enabled or content is None:
+            return
+        self._memory.set(key, content)
+        if self.persistent:
+            self._store_persistent(key, content, engine, model, language)
+        self._count('stores')
+
+    def record_bypass(self):
+        self._count('bypassed')
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        lookups = stats['memory_hits'] + stats['persistent_hits'] + stats['misses']
+        stats['hit_rate'] = round((lookups - stats['misses']) / lookups, 4) if lookups else 0.0
+        stats['memory_entries'] = len(self._memory)
+        stats['persistent'] = self.persistent
+        return stats
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    def _load_persistent(self, key):
+        # Read on its own connection so a miss doesn't leave the caller's session
+        # holding one while the engine generates
+        from flask import current_app
+        from app import db
+        from app.models import CachedResponse
+        table = CachedResponse.__table__
+        try:
+            with db.engine.connect() as conn:
+                row = conn.execute(
+                    table.select()
+                    .with_only_columns(table.c.response)
+                    .where(table.c.key == key)
+                    .where(table.c.created_at >= datetime.utcnow() - timedelta(seconds=self.ttl))
+                ).first()
+            return row.response if row else None
+        except Exception as e:
+            current_app.logger.error(f"Response cache read error: {str(e)}")
+            return None
+
+    def _store_persistent(self, key, content, engine, model, language):
+        # Written on its own connection so the caller's transaction is unaffected
+        from flask import current_app
+        from app import db
+        from app.models import CachedResponse
+        table = CachedResponse.__table__
+        values = {
+            'key': key,
+            'engine': engine,
+            'model': model,
+            'language': language,
+            'response': content,
+            'created_at': datetime.utcnow()
+        }
+        try:
+            with db.engine.begin() as conn:
+                upsert = _upsert_statement(conn.dialect.name, table, values)
+                if upsert is not None:
+                    conn.execute(upsert)
+                elif not conn.execute(table.update().where(table.c.key == key).values(**values)).rowcount:
+                    conn.execute(table.insert().values(**values))
+        except IntegrityError:
+            pass  # Another worker stored the same key first; its content is equivalent
+        except Exception as e:
+            current_app.logger.error(f"Response cache write error: {str(e)}")
+        self._purge.maybe_run()
+
+    def purge_expired(self):
+        """Delete persistent entries older than the TTL in batches; returns the number removed"""
+        from app import db
+        from app.models import CachedResponse
+        table = CachedResponse.__table__
+        with self.app.app_context():
+            engine = db.engine
+        cutoff = datetime.utcnow() - timedelta(seconds=self.ttl)
+        return delete_in_batches(engine, table, table.c.created_at < cutoff, self.purge_batch_size)
+
+def _upsert_statement(dialect, table, values):
+    """INSERT ... ON CONFLICT (key) DO UPDATE for SQLite and Postgres; None for other databases"""
+    if dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    elif dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        return None
+    stmt = insert(table).values(**values)
+    return stmt.on_conflict_do_update(
+        index_elements=[table.c.key],
+        set_={column: stmt.excluded[column] for column in values if column != 'key'}
+    )
@@ -0,0 +1,116 @@
+import hashlib
+import os
+
+SEPARATOR = ' > '
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'full_clothing_combinations.txt')
+
+class CategoryCatalogue:
+    """The ' > '-delimited clothing category hierarchy, parsed once into a tree
+
+    Every node path ("Men > Tops") and node name ("Tops") is also kept in a set
+    so incoming categories can be validated in O(1).
+    """
+
+    def __init__(self, path=DEFAULT_PATH):
+        self.path = path
+        self.paths = []
+        self.etag = None
+        self._root = {}
+        self._index = set()
+
+    def init_app(self, app):
+        self.path = app.config.get('CATEGORY_DATA_PATH') or self.path
+        try:
+            self.load()
+        except Exception as e:
+            app.logger.error(f"Error loading category data: {str(e)}")
+
+    def load(self):
+        with open(self.path, 'rb') as file:
+            raw = file.read()
+
+        paths = []
+        root = {}
+        index = set()
+        for line in raw.decode('utf-8').splitlines():
+            line = line.strip()
+            if not line:
+                continue
+            paths.append(line)
+            node = root
+            parts = [part.strip() for part in line.split('>')]
+            for depth, name in enumerate(parts):
+                key = name.casefold()
+                child = node.get(key)
+                if child is None:
+                    child = node[key] = {'name': name, 'path': SEPARATOR.join(parts[:depth + 1]), 'children': {}}
+                index.add(key)
+                index.add(_normalize(child['path']))
+                if depth == len(parts) - 1:
+                    child['listed'] = True
+                node = child['children']
+
+        self.paths = paths
+        self._root = root
+        self._index = index
+        self.etag = hashlib.sha1(raw).hexdigest()
+
+    @property
+    def loaded(self):
+        return bool(self.paths)
+
+    def contains(self, category):
+        """True if category names a node, either by full path or by its own name"""
+        return _normalize(category) in self._index
+
+    def search(self, prefix=None, q=None):
+        """Return leaf paths under `prefix` whose path contains `q` (both case-insensitive)"""
+        if prefix:
+            node = self._find(prefix)
+            if node is None:
+                return []
+            paths = list(_listed_paths(node))
+        else:
+            paths = self.paths
+
+        if q:
+            needle = q.casefold()
+            paths = [path for path in paths if needle in path.casefold()]
+        return paths
+
+    def tree(self, prefix=None):
+        """Return the hierarchy (or the subtree at prefix) as nested dicts"""
+        if prefix:
+            node = self._find(prefix)
+            return [_serialize(node)] if node else []
+        return [_serialize(node) for node in self._root.values()]
+
+    def _find(self, prefix):
+        node = None
+        children = self._root
+        for name in prefix.split('>'):
+            node = children.get(name.strip().casefold())
+            if node is None:
+                return None
+            children = node['children']
+        return node
+
+def _normalize(category):
+    return SEPARATOR.join(part.strip() for part in category.split('>')).casefold()
+
+def _listed_paths(node):
+    """Yield the paths of every listed line at or below node, in file order"""
+    if node.get('listed'):
+        yield node['path']
+    for child in node['children'].values():
+        yield from _listed_paths(child)
+
+def _serialize(node):
+    return {
+        'name': node['name'],
+        'path': node['path'],
+        'children': [_serialize(child) for child in node['children'].values()]
+    }
+
+catalogue = CategoryCatalogue()
@@ -0,0 +1,245 @@
+import math
+import threading
+import time
+from flask import current_app
+from app.utils.metrics import CIRCUIT_OPEN, ENGINE_FAILOVERS, ENGINE_REJECTIONS
+from app.utils.ollama_client import (
+    EngineBusy, EngineError, EngineUnavailable, generate_content, stream_content
+)
+
+ENGINES = ('ollama', 'openai')
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker for one engine
+
+    After `threshold` failures in a row the circuit opens and calls are refused
+    for `reset_timeout` seconds. Then a single trial call is let through
+    (half-open): success closes the circuit, failure opens it again.
+    """
+
+    def __init__(self, name, threshold=5, reset_timeout=30):
+        self.name = name
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._opened_at is None:
+                return 'closed'
+            if time.monotonic() - self._opened_at < self.reset_timeout:
+                return 'open'
+            return 'half_open'
+
+    def retry_after(self):
+        """Seconds until the next trial call is allowed"""
+        with self._lock:
+            if self._opened_at is None:
+                return 0
+            return max(1, math.ceil(self.reset_timeout - (time.monotonic() - self._opened_at)))
+
+    def allow(self):
+        """Return True if a call may go ahead"""
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at < self.reset_timeout or self._trial_running:
+                return False
+            self._trial_running = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._trial_running = False
+            if self._opened_at is not None:
+                self._opened_at = None
+                CIRCUIT_OPEN.set(0, engine=self.name)
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._trial_running or self._failures >= self.threshold:
+                self._opened_at = time.monotonic()
+                self._trial_running = False
+                CIRCUIT_OPEN.set(1, engine=self.name)
+
+    def release_trial(self):
+        """Give up a trial slot without a verdict, e.g. when the caller went away"""
+        with self._lock:
+            self._trial_running = False
+
+class _Backend:
+    def __init__(self, name, concurrency, threshold, reset_timeout):
+        self.name = name
+        self.slots = threading.BoundedSemaphore(concurrency)
+        self.breaker = CircuitBreaker(name, threshold, reset_timeout)
+
+class RoutedStream:
+    """Token stream from one engine that holds the engine's slot until it ends
+
+    Iterate it to the end or close() it; either releases the slot.
+    """
+
+    def __init__(self, engine, backend, first, tokens):
+        self.engine = engine
+        self._backend = backend
+        self._first = first
+        self._tokens = tokens
+        self._released = False
+
+    def __iter__(self):
+        succeeded = False
+        try:
+            if self._first is not None:
+                yield self._first
+            yield from self._tokens
+            succeeded = True
+        except EngineError:
+            self._backend.breaker.record_failure()
+            raise
+        finally:
+            self._release(succeeded)
+
+    def close(self):
+        self._release(False)
+
+    def _release(self, succeeded):
+        if self._released:
+            return
+        self._released = True
+        if succeeded:
+            self._backend.breaker.record_success()
+        else:
+            self._backend.breaker.release_trial()
+        self._tokens.close()
+        self._backend.slots.release()
+
+class EngineRouter:
+    """Routes generations to an engine behind a concurrency cap and circuit breaker
+
+    Each engine gets a per-worker semaphore: callers wait up to `queue_timeout`
+    seconds for a slot and then get EngineBusy instead of piling onto a
+    saturated backend. An engine that keeps failing has its circuit opened and
+    is refused immediately with EngineUnavailable until a trial call succeeds.
+    With failover enabled, a request the chosen engine can't serve is retried
+    once on the other engine. Every failure is raised as an EngineError.
+    """
+
+    def __init__(self):
+        self.queue_timeout = 30
+        self.failover = False
+        self._backends = {}
+
+    def init_app(self, app):
+        self.queue_timeout = app.config.get('ENGINE_QUEUE_TIMEOUT', self.queue_timeout)
+        self.failover = app.config.get('ENGINE_FAILOVER', self.failover)
+        threshold = app.config.get('ENGINE_BREAKER_THRESHOLD', 5)
+        reset_timeout = app.config.get('ENGINE_BREAKER_RESET', 30)
+        self._backends = {
+            'ollama': _Backend('ollama', app.config.get('ENGINE_CONCURRENCY_OLLAMA', 4), threshold, reset_timeout),
+            'openai': _Backend('openai', app.config.get('ENGINE_CONCURRENCY_OPENAI', 128), threshold, reset_timeout),
+        }
+
+    @staticmethod
+    def normalize(engine):
+        """Map a requested engine onto a known one; anything but Ollama means OpenAI"""
+        return 'ollama' if engine == 'ollama' else 'openai'
+
+    def status(self):
+        return {name: backend.breaker.state for name, backend in self._backends.items()}
+
+    def generate(self, engine, prompt):
+        """Generate a complete response; returns (content, engine actually used)"""
+        first_error = None
+        for name in self.candidates(engine):
+            if first_error is not None:
+                ENGINE_FAILOVERS.inc(from_engine=self.normalize(engine), to_engine=name)
+            backend = self._backends[name]
+            try:
+                self._acquire(backend)
+            except EngineError as e:
+                first_error = first_error or e
+                continue
+            try:
+                content = generate_content(name, prompt)
+            except EngineError as e:
+                backend.breaker.record_failure()
+                first_error = first_error or e
+                continue
+            except BaseException:
+                backend.breaker.release_trial()
+                raise
+            finally:
+                backend.slots.release()
+            backend.breaker.record_success()
+            return content, name
+        raise first_error
+
+    def open_stream(self, engine, prompt):
+        """Start streaming a response and return it as a RoutedStream
+
+        Failover only happens before the first token arrives; once output has
+        been sent, a failure is raised from the stream.
+        """
+        first_error = None
+        for name in self.candidates(engine):
+            if first_error is not None:
+                ENGINE_FAILOVERS.inc(from_engine=self.normalize(engine), to_engine=name)
+            backend = self._backends[name]
+            try:
+                self._acquire(backend)
+            except EngineError as e:
+                first_error = first_error or e
+                continue
+
+            tokens = stream_content(name, prompt)
+            try:
+                first = next(tokens, None)
+            except EngineError as e:
+                backend.breaker.record_failure()
+                backend.slots.release()
+                first_error = first_error or e
+                continue
+            except BaseException:
+                backend.breaker.release_trial()
+                backend.slots.release()
+                raise
+            return RoutedStream(name, backend, first, tokens)
+        raise first_error
+
+    def candidates(self, engine):
+        """Engines a request for engine may be served by, in the order they're tried"""
+        primary = self.normalize(engine)
+        if not self.failover:
+            return [primary]
+        return [primary] + [name for name in ENGINES if name != primary]
+
+    def _acquire(self, backend):
+        """Take a slot on backend or raise EngineUnavailable / EngineBusy"""
+        if not self._backends:
+            raise RuntimeError('EngineRouter.init_app() has not been called')
+        if not backend.breaker.allow():
+            ENGINE_REJECTIONS.inc(engine=backend.name, reason='circuit_open')
+            raise EngineUnavailable(
+                f"{self._label(backend.name)} is temporarily unavailable, please retry shortly.",
+                retry_after=backend.breaker.retry_after()
+            )
+        if not backend.slots.acquire(timeout=self.queue_timeout):
+            backend.breaker.release_trial()
+            ENGINE_REJECTIONS.inc(engine=backend.name, reason='busy')
+            current_app.logger.warning(f"No free {backend.name} slot within {self.queue_timeout}s")
+            raise EngineBusy(
+                f"{self._label(backend.name)} is busy, please retry shortly.",
+                retry_after=max(1, math.ceil(self.queue_timeout))
+            )
+
+    @staticmethod
+    def _label(name):
+        return 'Ollama' if name == 'ollama' else 'OpenAI'
+
+engine_router = EngineRouter()
@@ -0,0 +1,82 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+class HashingBusy(Exception):
+    """Raised when a password hash can't be scheduled or started in time"""
+
+    def __init__(self, retry_after=1):
+        super().__init__("Too many logins in progress, please retry shortly")
+        self.retry_after = retry_after
+
+class PasswordHasher:
+    """bcrypt hashing and checking on a small bounded thread pool
+
+    At most `max_workers` hashes run at once per worker process, so a login
+    burst can't take every CPU away from generation traffic. Up to
+    `max_pending` more wait in the queue; beyond that, or when a queued hash
+    hasn't started within `timeout` seconds, HashingBusy is raised so the
+    caller can answer 503 instead of stalling.
+    """
+
+    def __init__(self, rounds=12, max_workers=2, max_pending=32, timeout=5):
+        self.rounds = rounds
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(max_workers + max_pending)
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.rounds = app.config.get('BCRYPT_LOG_ROUNDS', self.rounds)
+        self.max_workers = app.config.get('PASSWORD_HASH_WORKERS', self.max_workers)
+        self.max_pending = app.config.get('PASSWORD_HASH_QUEUE', self.max_pending)
+        self.timeout = app.config.get('PASSWORD_HASH_TIMEOUT', self.timeout)
+        self._slots = threading.BoundedSemaphore(self.max_workers + self.max_pending)
+
+    def hash(self, password):
+        """Return a bcrypt hash of password at the configured cost"""
+        from app import bcrypt
+        return self._run(bcrypt.generate_password_hash, password, self.rounds).decode('utf-8')
+
+    def check(self, pw_hash, password):
+        from app import bcrypt
+        return self._run(bcrypt.check_password_hash, pw_hash, password)
+
+    def needs_rehash(self, pw_hash):
+        """True when pw_hash was made with a different cost than the configured one"""
+        try:
+            return int(pw_hash.split('$')[2]) != self.rounds
+        except (AttributeError, IndexError, ValueError):
+            return False
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            raise HashingBusy()
+
+        try:
+            future = self._get_executor().submit(fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeout:
+            if future.cancel():
+                raise HashingBusy()
+            # Already hashing; it finishes within one bcrypt round trip
+            return future.result()
+
+    def _get_executor(self):
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.max_workers,
+                        thread_name_prefix='password-hash'
+                    )
+        return self._executor
+
+password_hasher = PasswordHasher()
@@ -0,0 +1,276 @@
+import os
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from app.utils.purge import PeriodicPurge, delete_in_batches
+
+class QueueFullError(Exception):
+    """Raised when the job queue has no room for another job"""
+
+class JobCancelled(Exception):
+    """Raised from inside a job once it notices it has been cancelled"""
+
+class Job:
+    """A unit of background work and its current status"""
+
+    def __init__(self, user_id, queue=None):
+        self.id = uuid.uuid4().hex
+        self.user_id = user_id
+        self.status = 'queued'
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.cancel_requested = False
+        self.future = None
+        self._queue = queue
+        self._cancel_event = threading.Event()
+
+    @classmethod
+    def from_row(cls, row):
+        job = cls(row.user_id)
+        job.id = row.id
+        job.status = row.status
+        job.result = row.result
+        job.error = row.error
+        job.created_at = row.created_at
+        job.started_at = row.started_at
+        job.finished_at = row.finished_at
+        job.cancel_requested = row.cancel_requested
+        return job
+
+    @property
+    def cancelled(self):
+        return self._cancel_event.is_set()
+
+    @property
+    def finished(self):
+        return self.status in ('succeeded', 'failed', 'cancelled')
+
+    def check_cancelled(self):
+        """Abort the running job if cancellation was requested, on any worker"""
+        if not self.cancelled and self._queue is not None and self._queue.cancel_requested(self.id):
+            self._cancel_event.set()
+        if self.cancelled:
+            raise JobCancelled()
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'status': self.status,
+            'result': self.result,
+            'error': self.error,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'cancel_requested': self.cancel_requested
+        }
+
+class JobQueue:
+    """Bounded worker pool for long running generations, with job state in the database
+
+    Jobs run on the submitting worker's threads: beyond max_workers they wait in
+    the executor's queue, and once max_pending of this worker's jobs are queued
+    or running, new submissions are rejected to apply back-pressure. Status and
+    results live in the generation_job table, so a poll or cancel can land on
+    any worker. The owning worker refreshes heartbeat_at on its unfinished jobs
+    every `heartbeat_interval` seconds; jobs whose heartbeat is four intervals
+    old belonged to a worker that stopped, and the periodic purge marks them
+    failed. Finished jobs are purged after `retention` seconds.
+    """
+
+    def __init__(self, max_workers=4, max_pending=32, retention=3600):
+        self.app = None
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.retention = retention
+        self.heartbeat_interval = 30
+        self.purge_batch_size = 500
+        self._executor = None
+        self._owner = None
+        self._jobs = {}  # this worker's unfinished jobs
+        self._lock = threading.Lock()
+        self._purge = PeriodicPurge(self._clean_up, 'finished jobs', 600)
+
+    def init_app(self, app):
+        self.app = app
+        self.max_workers = app.config.get('JOB_WORKERS', self.max_workers)
+        self.max_pending = app.config.get('JOB_QUEUE_MAX', self.max_pending)
+        self.retention = app.config.get('JOB_RETENTION', self.retention)
+        self.heartbeat_interval = app.config.get('JOB_HEARTBEAT_INTERVAL', self.heartbeat_interval)
+        self._purge = PeriodicPurge(
+            self._clean_up, 'finished jobs', app.config.get('JOB_PURGE_INTERVAL', 600), app.logger
+        )
+
+    @property
+    def _table(self):
+        from app.models import GenerationJob
+        return GenerationJob.__table__
+
+    def _engine(self):
+        from app import db
+        with self.app.app_context():
+            return db.engine
+
+    @property
+    def depth(self):
+        """Number of this worker's jobs that are queued or running"""
+        with self._lock:
+            return len(self._jobs)
+
+    def submit(self, app, user_id, fn, *args, **kwargs):
+        """Queue fn(job, *args, **kwargs) to run inside an app context"""
+        with self._lock:
+            if len(self._jobs) >= self.max_pending:
+                raise QueueFullError()
+
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers,
+                    thread_name_prefix='generation-job'
+                )
+                # Unique per worker process, even when a restarted worker reuses a pid
+                self._owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+                threading.Thread(target=self._heartbeat, name='job-heartbeat', daemon=True).start()
+
+            job = Job(user_id, self)
+            self._jobs[job.id] = job
+
+        try:
+            with self._engine().begin() as conn:
+                conn.execute(self._table.insert().values(
+                    id=job.id,
+                    user_id=user_id,
+                    status=job.status,
+                    created_at=job.created_at,
+                    cancel_requested=False,
+                    owner=self._owner,
+                    heartbeat_at=job.created_at
+                ))
+            job.future = self._executor.submit(self._run, app, job, fn, args, kwargs)
+        except BaseException:
+            self._forget(job)
+            raise
+        self._purge.maybe_run()
+        return job
+
+    def get(self, job_id):
+        table = self._table
+        with self._engine().connect() as conn:
+            row = conn.execute(table.select().where(table.c.id == job_id)).first()
+        self._purge.maybe_run()
+        return Job.from_row(row) if row else None
+
+    def cancel(self, job_id):
+        """Cancel a job; queued jobs never start, running jobs stop at their next checkpoint"""
+        table = self._table
+        with self._engine().begin() as conn:
+            cancelled = conn.execute(
+                table.update()
+                .where(table.c.id == job_id, table.c.status == 'queued')
+                .values(status='cancelled', finished_at=time.time())
+            ).rowcount
+            if not cancelled:
+                cancelled = conn.execute(
+                    table.update()
+                    .where(table.c.id == job_id, table.c.status == 'running')
+                    .values(cancel_requested=True)
+                ).rowcount
+
+        # On the worker that owns the job, stop it without waiting for a checkpoint's query
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is not None:
+            job._cancel_event.set()
+            if job.future is not None and job.future.cancel():
+                self._forget(job)
+        return bool(cancelled)
+
+    def cancel_requested(self, job_id):
+        table = self._table
+        with self._engine().connect() as conn:
+            return bool(conn.execute(
+                table.select().with_only_columns(table.c.cancel_requested).where(table.c.id == job_id)
+            ).scalar())
+
+    def _run(self, app, job, fn, args, kwargs):
+        with app.app_context():
+            try:
+                # Claim the job; a cancel that got here first (on any worker) leaves nothing to do
+                if job.cancelled or not self._transition(job.id, 'queued', status='running', started_at=time.time()):
+                    return
+                job.status = 'running'
+
+                values = {}
+                try:
+                    values.update(status='succeeded', result=fn(job, *args, **kwargs))
+                except JobCancelled:
+                    values.update(status='cancelled')
+                except Exception as e:
+                    app.logger.error(f"Job {job.id} failed: {str(e)}")
+                    values.update(status='failed', error=str(e))
+                values['finished_at'] = time.time()
+                self._transition(job.id, 'running', **values)
+            except Exception as e:
+                app.logger.error(f"Job {job.id} status could not be saved: {str(e)}")
+            finally:
+                self._forget(job)
+
+    def _transition(self, job_id, from_status, **values):
+        """Update a job still in from_status; returns False if it has moved on"""
+        table = self._table
+        with self._engine().begin() as conn:
+            return conn.execute(
+                table.update()
+                .where(table.c.id == job_id, table.c.status == from_status)
+                .values(**values)
+            ).rowcount > 0
+
+    def _forget(self, job):
+        with self._lock:
+            self._jobs.pop(job.id, None)
+
+    def _heartbeat(self):
+        table = self._table
+        while True:
+            time.sleep(self.heartbeat_interval)
+            with self._lock:
+                if not self._jobs:
+                    continue
+            try:
+                with self._engine().begin() as conn:
+                    conn.execute(
+                        table.update()
+                        .where(table.c.owner == self._owner, table.c.status.in_(('queued', 'running')))
+                        .values(heartbeat_at=time.time())
+                    )
+            except Exception as e:
+                self.app.logger.error(f"Job heartbeat failed: {str(e)}")
+
+    def reap_stale(self):
+        """Mark queued or running jobs whose worker stopped heartbeating as failed; returns how many"""
+        table = self._table
+        now = time.time()
+        with self._engine().begin() as conn:
+            return conn.execute(
+                table.update()
+                .where(table.c.status.in_(('queued', 'running')))
+                .where(table.c.heartbeat_at < now - 4 * self.heartbeat_interval)
+                .values(status='failed', error='The worker running this job stopped', finished_at=now)
+            ).rowcount
+
+    def _clean_up(self):
+        reaped = self.reap_stale()
+        if reaped:
+            self.app.logger.warning(f"Marked {reaped} jobs failed after their worker stopped")
+        return self.purge_finished()
+
+    def purge_finished(self):
+        """Delete jobs that finished over `retention` seconds ago, in batches; returns the number removed"""
+        table = self._table
+        return delete_in_batches(
+            self._engine(), table, table.c.finished_at < time.time() - self.retention, self.purge_batch_size
+        )
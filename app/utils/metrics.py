@@ -0,0 +1,183 @@
+import threading
+import time
+from contextlib import contextmanager
+from flask import g, has_request_context, request
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return lines
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _samples(self):
+        with self._lock:
+            values = dict(self._values)
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {value}" for key, value in values.items()]
+
+class Gauge(Counter):
+    kind = 'gauge'
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # [per-bucket counts, sum, count]
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+            state[1] += value
+            state[2] += 1
+
+    def _samples(self):
+        with self._lock:
+            values = {key: (list(counts), total, count) for key, (counts, total, count) in self._values.items()}
+        lines = []
+        for key, (counts, total, count) in values.items():
+            for bound, bucket_count in zip(self.buckets, counts):
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, ('le', bound))} {bucket_count}")
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, ('le', '+Inf'))} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+class MetricsRegistry:
+    """Process-local metrics rendered in the Prometheus text exposition format
+
+    Each gunicorn worker keeps its own values, so scrape every worker (or sum
+    across instances) when running more than one.
+    """
+
+    def __init__(self):
+        self._metrics = []
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def _register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+registry = MetricsRegistry()
+
+HTTP_REQUEST_SECONDS = registry.histogram(
+    'nichegen_http_request_duration_seconds', 'HTTP request latency', ['endpoint', 'method', 'status'])
+STAGE_SECONDS = registry.histogram(
+    'nichegen_stage_duration_seconds', 'Time spent in each stage of request handling', ['stage'])
+ENGINE_SECONDS = registry.histogram(
+    'nichegen_engine_request_duration_seconds', 'LLM engine call latency', ['engine', 'model'])
+ENGINE_ERRORS = registry.counter(
+    'nichegen_engine_errors_total', 'Failed LLM engine calls', ['engine', 'kind'])
+GENERATIONS_IN_FLIGHT = registry.gauge(
+    'nichegen_generations_in_flight', 'LLM engine calls currently running', ['engine'])
+ENGINE_REJECTIONS = registry.counter(
+    'nichegen_engine_rejections_total', 'Engine calls refused by the router without running', ['engine', 'reason'])
+ENGINE_FAILOVERS = registry.counter(
+    'nichegen_engine_failovers_total', 'Generations retried on the other engine', ['from_engine', 'to_engine'])
+CIRCUIT_OPEN = registry.gauge(
+    'nichegen_engine_circuit_open', 'Whether an engine circuit breaker is open (1) or closed (0)', ['engine'])
+COALESCED_REQUESTS = registry.counter(
+    'nichegen_coalesced_requests_total', 'Generations served from a concurrent identical request', ['scope'])
+CACHE_LOOKUPS = registry.counter(
+    'nichegen_response_cache_lookups_total', 'Response cache lookups', ['result'])
+
+@contextmanager
+def timed_stage(stage):
+    """Time a block as a request stage, for the histogram and the Server-Timing header"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - start)
+
+def record_stage(stage, elapsed):
+    STAGE_SECONDS.observe(elapsed, stage=stage)
+    if has_request_context():
+        timings = g.setdefault('_server_timing', {})
+        timings[stage] = timings.get(stage, 0.0) + elapsed
+
+def init_app(app):
+    app.before_request(_start_timer)
+    app.after_request(_finish_request)
+
+def _start_timer():
+    g._request_start = time.perf_counter()
+
+def _finish_request(response):
+    start = g.get('_request_start')
+    if start is not None:
+        HTTP_REQUEST_SECONDS.observe(
+            time.perf_counter() - start,
+            endpoint=request.endpoint or 'unknown',
+            method=request.method,
+            status=response.status_code
+        )
+
+    timings = g.get('_server_timing')
+    if timings:
+        response.headers['Server-Timing'] = ', '.join(
+            f"{stage};dur={elapsed * 1000:.1f}" for stage, elapsed in timings.items()
+        )
+    return response
@@ -1,71 +1,359 @@
+import json
+import threading
+import time
 import requests
+from requests.adapters import HTTPAdapter
 from flask import current_app
-import openai
+from app.utils.metrics import ENGINE_ERRORS, ENGINE_SECONDS, GENERATIONS_IN_FLIGHT, record_stage
 
-def generate_content(engine, prompt):
-    """Generate content using either Ollama or OpenAI"""
+class EngineError(Exception):
+    """Raised when an engine fails to produce content"""
+    status_code = 502
+    retry_after = None
+
+class EngineTimeout(EngineError):
+    """Raised when an engine doesn't answer within its timeout"""
+    status_code = 504
+
+class EngineUnavailable(EngineError):
+    """Raised without calling an engine whose circuit breaker is open"""
+    status_code = 503
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class EngineBusy(EngineError):
+    """Raised when no engine slot frees up within the queue timeout"""
+    status_code = 503
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class OllamaClient:
+    """Long-lived, thread-safe Ollama client with pooled keep-alive connections
+
+    requests.Session isn't safe to share between threads, so each thread gets
+    its own session, all mounted on one HTTPAdapter whose connection pool
+    (pool_size connections) is shared across the worker's threads.
+
+    Liveness is tracked as cached health state instead of probing /api/version
+    before every generation. A background thread refreshes it every
+    `health_interval` seconds, and every real request updates it too, so an
+    Ollama outage fails fast without waiting on a connect timeout.
+    """
+
+    def __init__(self, base_url, model, pool_size=10, connect_timeout=5,
+                 read_timeout=60, health_interval=30, logger=None):
+        self.base_url = base_url.rstrip('/')
+        self.model = model
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.health_interval = health_interval
+        self.logger = logger
+
+        self._adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self._local = threading.local()
+
+        self._healthy = True  # Assume healthy until a probe or request says otherwise
+        self._health_checked_at = None
+        self._monitor = None
+        self._stop = threading.Event()
+
+    @property
+    def session(self):
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = requests.Session()
+            session.mount('http://', self._adapter)
+            session.mount('https://', self._adapter)
+            self._local.session = session
+        return session
+
+    @property
+    def healthy(self):
+        return self._healthy
+
+    def check_health(self):
+        """Probe /api/version and record the result"""
+        try:
+            res = self.session.get(f"{self.base_url}/api/version", timeout=self.connect_timeout)
+            healthy = res.status_code == 200
+        except requests.exceptions.RequestException:
+            healthy = False
+        self._set_health(healthy)
+        return healthy
+
+    def start_health_monitor(self):
+        if self._monitor is not None or not self.health_interval:
+            return
+        self._monitor = threading.Thread(target=self._monitor_loop, name='ollama-health', daemon=True)
+        self._monitor.start()
+
+    def stop_health_monitor(self):
+        self._stop.set()
+
+    def generate(self, prompt):
+        """Generate a complete response for prompt"""
+        self._ensure_healthy()
+        res = self._post(prompt, stream=False)
+
+        if res.status_code != 200:
+            self._log_error(f"Ollama error: Status {res.status_code}, {res.text}")
+            raise EngineError(f"Error generating content with Ollama (Status: {res.status_code})")
+
+        content = res.json().get("response")
+        if not content:
+            raise EngineError("No response from Ollama")
+        return content
+
+    def stream(self, prompt):
+        """Yield response chunks for prompt as Ollama produces them"""
+        self._ensure_healthy()
+        res = self._post(prompt, stream=True)
+
+        with res:
+            if res.status_code != 200:
+                self._log_error(f"Ollama error: Status {res.status_code}, {res.text}")
+                raise EngineError(f"Error generating content with Ollama (Status: {res.status_code})")
+
+            try:
+                # Ollama streams newline-delimited JSON objects
+                for line in res.iter_lines():
+                    if not line:
+                        continue
+                    chunk = json.loads(line)
+                    if chunk.get("error"):
+                        self._log_error(f"Ollama error: {chunk['error']}")
+                        raise EngineError(f"Error generating content with Ollama: {chunk['error']}")
+                    token = chunk.get("response")
+                    if token:
+                        yield token
+                    if chunk.get("done"):
+                        break
+            except requests.exceptions.RequestException as e:
+                self._log_error(f"Ollama stream interrupted: {str(e)}")
+                error = EngineTimeout if isinstance(e, requests.exceptions.Timeout) else EngineError
+                raise error("Ollama took too long to generate content. Please try again with a simpler request or use OpenAI instead.")
+
+    def _post(self, prompt, stream):
+        try:
+            res = self.session.post(
+                f"{self.base_url}/api/generate",
+                json={
+                    "model": self.model,
+                    "prompt": prompt,
+                    "stream": stream
+                },
+                stream=stream,
+                timeout=(self.connect_timeout, self.read_timeout)
+            )
+        except requests.exceptions.ConnectTimeout:
+            self._set_health(False)
+            self._log_error("Ollama connection timed out: Is Ollama running?")
+            raise EngineTimeout(self._unreachable_message())
+        except requests.exceptions.ReadTimeout:
+            self._log_error("Ollama read timeout: The request took too long to process")
+            raise EngineTimeout("Ollama took too long to generate content. Please try again with a simpler request or use OpenAI instead.")
+        except requests.exceptions.ConnectionError:
+            self._set_health(False)
+            self._log_error("Ollama connection error: Is Ollama running?")
+            raise EngineError(self._unreachable_message())
+        except requests.exceptions.RequestException as e:
+            self._log_error(f"Ollama error: {str(e)}")
+            raise EngineError(f"Error connecting to Ollama: {str(e)}")
+
+        self._set_health(True)
+        return res
+
+    def _ensure_healthy(self):
+        if self._healthy:
+            return
+        # Re-probe inline when the cached state is older than one monitor interval
+        stale = self._health_checked_at is None or time.time() - self._health_checked_at >= self.health_interval
+        if stale and self.check_health():
+            return
+        raise EngineError(self._unreachable_message())
+
+    def _unreachable_message(self):
+        return f"Cannot connect to Ollama. Please make sure Ollama is running on your local machine ({self.base_url})."
+
+    def _set_health(self, healthy):
+        if healthy != self._healthy and self.logger:
+            self.logger.info(f"Ollama at {self.base_url} is now {'healthy' if healthy else 'unreachable'}")
+        self._healthy = healthy
+        self._health_checked_at = time.time()
+
+    def _monitor_loop(self):
+        while not self._stop.wait(self.health_interval):
+            self.check_health()
+
+    def _log_error(self, message):
+        if self.logger:
+            self.logger.error(message)
+
+class OpenAIClient:
+    """Reusable OpenAI chat client; the underlying httpx pool is shared by all requests
+
+    The openai package is imported here rather than at module load, so workers
+    that only ever use Ollama never pay for it. The client is safe to share
+    between threads; its connection pool is sized to max_connections.
+    """
+
+    def __init__(self, api_key, model, max_tokens=1500, timeout=60, base_url=None,
+                 max_connections=128, max_retries=0, logger=None):
+        import httpx
+        import openai
+        self.model = model
+        self.max_tokens = max_tokens
+        self.logger = logger
+        self.client = openai.OpenAI(
+            api_key=api_key,
+            base_url=base_url,
+            timeout=timeout,
+            # Retries are left to the engine router, so one call holds its slot for at most `timeout`
+            max_retries=max_retries,
+            http_client=httpx.Client(
+                timeout=timeout,
+                limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+            )
+        )
+        self._timeout_error = openai.APITimeoutError
+
+    def generate(self, prompt):
+        """Generate a complete response for prompt"""
+        try:
+            response = self.client.chat.completions.create(
+                model=self.model,
+                messages=[{"role": "user", "content": prompt}],
+                max_tokens=self.max_tokens
+            )
+            return response.choices[0].message.content
+        except self._timeout_error as e:
+            self._log_error(f"OpenAI timeout: {str(e)}")
+            raise EngineTimeout(f"OpenAI took too long to generate content: {str(e)}")
+        except Exception as e:
+            self._log_error(f"OpenAI error: {str(e)}")
+            raise EngineError(f"Error generating content with OpenAI: {str(e)}")
+
+    def stream(self, prompt):
+        """Yield response chunks for prompt as OpenAI produces them"""
+        try:
+            stream = self.client.chat.completions.create(
+                model=self.model,
+                messages=[{"role": "user", "content": prompt}],
+                max_tokens=self.max_tokens,
+                stream=True
+            )
+
+            for chunk in stream:
+                if not chunk.choices:
+                    continue
+                token = chunk.choices[0].delta.content
+                if token:
+                    yield token
+        except self._timeout_error as e:
+            self._log_error(f"OpenAI timeout: {str(e)}")
+            raise EngineTimeout(f"OpenAI took too long to generate content: {str(e)}")
+        except Exception as e:
+            self._log_error(f"OpenAI error: {str(e)}")
+            raise EngineError(f"Error generating content with OpenAI: {str(e)}")
+
+    def _log_error(self, message):
+        if self.logger:
+            self.logger.error(message)
+
+_client_lock = threading.Lock()
+
+def get_ollama_client():
+    """Return the app's shared OllamaClient, creating it on first use"""
+    app = current_app._get_current_object()
+    client = app.extensions.get('ollama_client')
+    if client is None:
+        with _client_lock:
+            client = app.extensions.get('ollama_client')
+            if client is None:
+                client = OllamaClient(
+                    base_url=app.config.get('OLLAMA_BASE_URL', 'http://localhost:11434'),
+                    model=app.config.get('OLLAMA_MODEL', 'llama3.2:latest'),
+                    pool_size=app.config.get('OLLAMA_POOL_SIZE', 10),
+                    connect_timeout=app.config.get('OLLAMA_CONNECT_TIMEOUT', 5),
+                    read_timeout=app.config.get('OLLAMA_READ_TIMEOUT', 60),
+                    health_interval=app.config.get('OLLAMA_HEALTH_INTERVAL', 30),
+                    logger=app.logger
+                )
+                client.start_health_monitor()
+                app.extensions['ollama_client'] = client
+    return client
+
+def get_openai_client():
+    """Return the app's shared OpenAIClient, creating it on first use"""
+    app = current_app._get_current_object()
+    client = app.extensions.get('openai_client')
+    if client is None:
+        api_key = app.config.get('OPENAI_API_KEY')
+        if not api_key:
+            app.logger.error("OpenAI API key not configured")
+            raise EngineError("OpenAI API key not configured. Please check your environment settings.")
+        with _client_lock:
+            client = app.extensions.get('openai_client')
+            if client is None:
+                client = OpenAIClient(
+                    api_key=api_key,
+                    model=app.config.get('OPENAI_MODEL', 'gpt-4'),
+                    max_tokens=app.config.get('OPENAI_MAX_TOKENS', 1500),
+                    timeout=app.config.get('OPENAI_TIMEOUT', 60),
+                    base_url=app.config.get('OPENAI_BASE_URL'),
+                    max_connections=app.config.get('ENGINE_CONCURRENCY_OPENAI', 128),
+                    max_retries=app.config.get('OPENAI_MAX_RETRIES', 0),
+                    logger=app.logger
+                )
+                app.extensions['openai_client'] = client
+    return client
+
+def get_model_name(engine):
+    """Return the model configured for an engine"""
     if engine == 'ollama':
-        return _generate_with_ollama(prompt)
-    else:
-        return _generate_with_openai(prompt)
+        return current_app.config.get('OLLAMA_MODEL', 'llama3.2:latest')
+    return current_app.config.get('OPENAI_MODEL', 'gpt-4')
+
+def generate_content(engine, prompt):
+    """Generate content using either Ollama or OpenAI
 
-def _generate_with_ollama(prompt):
-    """Generate content using Ollama local LLM"""
+    Failures are raised as an EngineError carrying a user-facing message, never
+    returned as content.
+    """
+    labels = {'engine': engine, 'model': get_model_name(engine)}
+    GENERATIONS_IN_FLIGHT.inc(engine=engine)
+    start = time.perf_counter()
     try:
-        current_app.logger.info("Attempting to connect to Ollama at http://localhost:11434")
-        
-        # First check if Ollama is running with a quick GET request
-        check_res = requests.get("http://localhost:11434/api/version", timeout=5)
-        if check_res.status_code != 200:
-            current_app.logger.error(f"Ollama server returned status code: {check_res.status_code}")
-            return "Ollama is not responding correctly. Please make sure it's running."
-            
-        # Proceed with generation if Ollama is running
-        res = requests.post(
-            "http://localhost:11434/api/generate", 
-            json={
-                "model": "llama3.2:latest", 
-                "prompt": prompt, 
-                "stream": False
-            },
-            timeout=60  # Increased timeout for generation
-        )
-        
-        if res.status_code != 200:
-            current_app.logger.error(f"Ollama error: Status {res.status_code}, {res.text}")
-            return f"Error generating content with Ollama (Status: {res.status_code})"
-            
-        return res.json().get("response", "No response from Ollama")
-    except requests.exceptions.ConnectTimeout:
-        current_app.logger.error("Ollama connection timed out: Is Ollama running?")
-        return "Cannot connect to Ollama. Please make sure Ollama is running on your local machine (http://localhost:11434)."
-    except requests.exceptions.ReadTimeout:
-        current_app.logger.error("Ollama read timeout: The request took too long to process")
-        return "Ollama took too long to generate content. Please try again with a simpler request or use OpenAI instead."
-    except requests.exceptions.ConnectionError:
-        current_app.logger.error("Ollama connection error: Is Ollama running?")
-        return "Cannot connect to Ollama. Please make sure Ollama is running on your local machine (http://localhost:11434)."
-    except Exception as e:
-        current_app.logger.error(f"Ollama error: {str(e)}")
-        return f"Error connecting to Ollama: {str(e)}"
-
-def _generate_with_openai(prompt):
-    """Generate content using OpenAI API"""
+        if engine == 'ollama':
+            return get_ollama_client().generate(prompt)
+        else:
+            return get_openai_client().generate(prompt)
+    except EngineError as e:
+        ENGINE_ERRORS.inc(engine=engine, kind='timeout' if isinstance(e, EngineTimeout) else 'error')
+        raise
+    finally:
+        GENERATIONS_IN_FLIGHT.dec(engine=engine)
+        elapsed = time.perf_counter() - start
+        ENGINE_SECONDS.observe(elapsed, **labels)
+        record_stage('engine', elapsed)
+
+def stream_content(engine, prompt):
+    """Yield content chunks from either Ollama or OpenAI as they are produced"""
+    labels = {'engine': engine, 'model': get_model_name(engine)}
+    GENERATIONS_IN_FLIGHT.inc(engine=engine)
+    start = time.perf_counter()
     try:
-        api_key = current_app.config.get('OPENAI_API_KEY')
-        if not api_key:
-            current_app.logger.error("OpenAI API key not configured")
-            return "OpenAI API key not configured. Please check your environment settings."
-        
-        openai.api_key = api_key
-        
-        response = openai.ChatCompletion.create(
-            model="gpt-4",
-            messages=[{"role": "user", "content": prompt}],
-            max_tokens=1500
-        )
-        
-        return response.choices[0].message["content"]
-    except Exception as e:
-        current_app.logger.error(f"OpenAI error: {str(e)}")
-        return f"Error generating content with OpenAI: {str(e)}"
\ No newline at end of file
+        if engine == 'ollama':
+            yield from get_ollama_client().stream(prompt)
+        else:
+            yield from get_openai_client().stream(prompt)
+    except EngineError as e:
+        ENGINE_ERRORS.inc(engine=engine, kind='timeout' if isinstance(e, EngineTimeout) else 'error')
+        raise
+    finally:
+        GENERATIONS_IN_FLIGHT.dec(engine=engine)
+        ENGINE_SECONDS.observe(time.perf_counter() - start, **labels)
@@ -0,0 +1,52 @@
+import threading
+import time
+
+class PeriodicPurge:
+    """Runs a purge function on a background thread, at most once per interval
+
+    Stores call maybe_run() from their write paths; a purge that is still
+    running is never started twice. `purge` returns the number of rows removed,
+    which is logged as "Purged <n> <label>".
+    """
+
+    def __init__(self, purge, label, interval=3600, logger=None):
+        self.purge = purge
+        self.label = label
+        self.interval = interval
+        self.logger = logger
+        self._last_run = time.monotonic()
+        self._lock = threading.Lock()
+
+    def maybe_run(self):
+        now = time.monotonic()
+        if now - self._last_run < self.interval or not self._lock.acquire(blocking=False):
+            return
+        self._last_run = now
+        threading.Thread(target=self._run, name='purge', daemon=True).start()
+
+    def _run(self):
+        try:
+            removed = self.purge()
+            if removed and self.logger:
+                self.logger.info(f"Purged {removed} {self.label}")
+        except Exception as e:
+            if self.logger:
+                self.logger.error(f"Purge of {self.label} failed: {str(e)}")
+        finally:
+            self._lock.release()
+
+def delete_in_batches(engine, table, condition, batch_size=500):
+    """Delete rows of table matching condition, batch_size per transaction; returns the number removed"""
+    key = next(iter(table.primary_key.columns))
+    total = 0
+    while True:
+        with engine.begin() as conn:
+            batch_keys = table.select() \
+                .with_only_columns(key) \
+                .where(condition) \
+                .limit(batch_size) \
+                .scalar_subquery()
+            removed = conn.execute(table.delete().where(key.in_(batch_keys))).rowcount
+        total += removed
+        if removed < batch_size:
+            return total
@@ -0,0 +1,122 @@
+import math
+import time
+from collections import namedtuple
+from sqlalchemy import case, literal
+from sqlalchemy.exc import IntegrityError
+
+RateLimitResult = namedtuple('RateLimitResult', ['allowed', 'limit', 'remaining', 'reset_after', 'retry_after'])
+
+class RateLimiter:
+    """Per-user token bucket stored in the rate_limit_bucket table
+
+    Each user's bucket holds up to `limit` tokens and refills continuously at
+    limit / RATE_LIMIT_WINDOW tokens per second. Refill and consumption happen
+    in one conditional UPDATE, so concurrent requests across workers can't
+    overspend, and the charge is committed on its own connection so it survives
+    a later rollback of the view's transaction.
+    """
+
+    def __init__(self):
+        self.window = 3600
+        self.app = None
+
+    def init_app(self, app):
+        self.window = app.config.get('RATE_LIMIT_WINDOW', self.window)
+        self.app = app
+
+    def limit_for(self, identity):
+        config = self.app.config
+        return config['RATE_LIMIT_PAID'] if identity.is_paid else config['RATE_LIMIT_DEFAULT']
+
+    def consume(self, user_id, limit, cost=1):
+        """Take `cost` tokens from the user's bucket if they are available"""
+        table = self._table
+        rate = limit / self.window
+
+        for _ in range(2):
+            now = time.time()
+            refilled = table.c.tokens + (literal(now) - table.c.updated_at) * rate
+            available = case((refilled > limit, literal(float(limit))), else_=refilled)
+            stmt = table.update() \
+                .where(table.c.user_id == user_id) \
+                .where(available >= cost) \
+                .values(tokens=available - cost, updated_at=now)
+
+            with self._engine().begin() as conn:
+                if conn.dialect.update_returning:
+                    tokens = conn.execute(stmt.returning(table.c.tokens)).scalar()
+                elif conn.execute(stmt).rowcount:
+                    # Without RETURNING, read back inside the same transaction
+                    tokens = self._read_tokens(conn, user_id)
+                else:
+                    tokens = None
+
+                if tokens is not None:
+                    return self._result(True, limit, tokens, rate)
+
+                state = conn.execute(
+                    table.select()
+                    .with_only_columns(table.c.tokens, table.c.updated_at)
+                    .where(table.c.user_id == user_id)
+                ).first()
+
+            if state is not None:
+                available_now = min(float(limit), state.tokens + (now - state.updated_at) * rate)
+                return self._result(False, limit, available_now, rate, cost)
+
+            if cost > limit:
+                return self._result(False, limit, float(limit), rate, cost)
+
+            # First request from this user: start with a full bucket
+            try:
+                with self._engine().begin() as conn:
+                    conn.execute(table.insert().values(user_id=user_id, tokens=limit - cost, updated_at=now))
+                return self._result(True, limit, limit - cost, rate)
+            except IntegrityError:
+                continue  # Another worker created the bucket first; retry the update
+
+        return self._result(False, limit, 0.0, rate, cost)
+
+    def refund(self, user_id, cost=1):
+        """Return tokens for work that was charged but never started"""
+        table = self._table
+        with self._engine().begin() as conn:
+            conn.execute(table.update().where(table.c.user_id == user_id).values(tokens=table.c.tokens + cost))
+
+    def _result(self, allowed, limit, tokens, rate, cost=1):
+        remaining = max(0, math.floor(tokens))
+        reset_after = max(0, math.ceil((limit - tokens) / rate)) if rate else 0
+        if allowed:
+            retry_after = 0
+        elif cost > limit or not rate:
+            retry_after = self.window
+        else:
+            retry_after = max(1, math.ceil((cost - tokens) / rate))
+        return RateLimitResult(allowed, limit, remaining, reset_after, retry_after)
+
+    def _read_tokens(self, conn, user_id):
+        table = self._table
+        return conn.execute(
+            table.select().with_only_columns(table.c.tokens).where(table.c.user_id == user_id)
+        ).scalar()
+
+    @property
+    def _table(self):
+        from app.models import RateLimitBucket
+        return RateLimitBucket.__table__
+
+    def _engine(self):
+        from app import db
+        return db.engine
+
+def rate_limit_headers(result):
+    headers = {
+        'X-RateLimit-Limit': str(result.limit),
+        'X-RateLimit-Remaining': str(result.remaining),
+        'X-RateLimit-Reset': str(result.reset_after)
+    }
+    if not result.allowed:
+        headers['Retry-After'] = str(result.retry_after)
+    return headers
+
+rate_limiter = RateLimiter()
@@ -0,0 +1,252 @@
+import re
+import threading
+import time
+from sqlalchemy import bindparam, event, inspect, text
+from app.models import Generation
+
+HIGHLIGHT_START = '<mark>'
+HIGHLIGHT_END = '</mark>'
+
+_SQLITE_DDL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS generation_fts USING fts5("
+    "owner, niche, response, engine UNINDEXED, language UNINDEXED, tokenize = 'unicode61')",
+)
+_POSTGRES_DDL = (
+    "CREATE TABLE IF NOT EXISTS generation_search ("
+    "generation_id INTEGER PRIMARY KEY REFERENCES generation (id) ON DELETE CASCADE, "
+    "user_id INTEGER NOT NULL, engine VARCHAR(50), language VARCHAR(10), document TSVECTOR NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS ix_generation_search_document ON generation_search USING GIN (document)",
+    "CREATE INDEX IF NOT EXISTS ix_generation_search_user_id ON generation_search (user_id)",
+)
+
+class SearchIndex:
+    """Full-text index over Generation.niche and Generation.response
+
+    SQLite uses an FTS5 table (generation_fts) keyed by generation id, with
+    the owner stored as an indexed token so a search only touches that user's
+    postings. Postgres uses a generation_search table with a weighted tsvector
+    under a GIN index. Rows are indexed in the same transaction that inserts
+    the generation; `flask reindex-search` rebuilds the whole index. Other
+    databases, or a database whose index table hasn't been created yet, fall
+    back to a LIKE scan of the searching user's own rows.
+    """
+
+    TABLES = {'sqlite': 'generation_fts', 'postgresql': 'generation_search'}
+
+    def __init__(self):
+        self.enabled = True
+        self.text_config = 'english'
+        self.recheck_interval = 60
+        self._ready = {}
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.enabled = app.config.get('SEARCH_ENABLED', True)
+        self.text_config = app.config.get('SEARCH_TEXT_CONFIG', self.text_config)
+
+    def supports(self, bind):
+        return bind.dialect.name in self.TABLES
+
+    def create_schema(self, engine):
+        """Create the index table for engine's dialect; returns False if it has none"""
+        dialect = engine.dialect.name
+        if dialect not in self.TABLES:
+            return False
+        statements = _SQLITE_DDL if dialect == 'sqlite' else _POSTGRES_DDL
+        with engine.begin() as conn:
+            for statement in statements:
+                conn.execute(text(statement))
+        with self._lock:
+            self._ready[str(engine.url)] = (True, time.monotonic())
+        return True
+
+    def is_ready(self, connection):
+        """Cached check that the index table exists on this database"""
+        if not self.enabled or not self.supports(connection):
+            return False
+        key = str(connection.engine.url)
+        with self._lock:
+            ready, checked_at = self._ready.get(key, (None, 0))
+        # A missing table is looked for again periodically, in case init-db ran since
+        if ready or (ready is False and time.monotonic() - checked_at < self.recheck_interval):
+            return ready
+        ready = inspect(connection).has_table(self.TABLES[connection.dialect.name])
+        with self._lock:
+            self._ready[key] = (ready, time.monotonic())
+        return ready
+
+    def add(self, connection, rows):
+        """Index rows, each a mapping of id, user_id, niche, response, engine and language"""
+        if not rows:
+            return
+        if connection.dialect.name == 'sqlite':
+            connection.execute(text(
+                "INSERT OR REPLACE INTO generation_fts (rowid, owner, niche, response, engine, language) "
+                "VALUES (:id, :owner, :niche, :response, :engine, :language)"
+            ), [{**row, 'owner': _owner_token(row['user_id'])} for row in rows])
+        else:
+            connection.execute(text(
+                "INSERT INTO generation_search (generation_id, user_id, engine, language, document) "
+                "VALUES (:id, :user_id, :engine, :language, "
+                "setweight(to_tsvector(CAST(:config AS regconfig), coalesce(:niche, '')), 'A') || "
+                "setweight(to_tsvector(CAST(:config AS regconfig), coalesce(:response, '')), 'B')) "
+                "ON CONFLICT (generation_id) DO UPDATE SET "
+                "user_id = EXCLUDED.user_id, engine = EXCLUDED.engine, "
+                "language = EXCLUDED.language, document = EXCLUDED.document"
+            ), [{**row, 'config': self._config_for(row['language'])} for row in rows])
+
+    def remove(self, connection, generation_id):
+        if connection.dialect.name == 'sqlite':
+            connection.execute(text("DELETE FROM generation_fts WHERE rowid = :id"), {'id': generation_id})
+        else:
+            connection.execute(text("DELETE FROM generation_search WHERE generation_id = :id"), {'id': generation_id})
+
+    def search(self, connection, user_id, query, engine=None, language=None, limit=20, offset=0):
+        """Return [(generation_id, score, niche_highlight, snippet)] best match first
+
+        Returns None when the index can't serve the search, so callers can
+        fall back to a plain scan.
+        """
+        if not self.is_ready(connection):
+            return None
+        params = {'limit': limit, 'offset': offset, 'engine': engine, 'language': language}
+
+        def filters(prefix=''):
+            return ''.join(f" AND {prefix}{column} = :{column}" for column in ('engine', 'language') if params[column])
+
+        if connection.dialect.name == 'sqlite':
+            terms = _fts5_terms(query)
+            if not terms:
+                return []
+            params['match'] = f'owner : "{_owner_token(user_id)}" AND {{niche response}} : ({terms})'
+            rows = connection.execute(text(
+                "SELECT rowid AS id, -bm25(generation_fts, 0.0, 4.0, 1.0) AS score, "
+                f"highlight(generation_fts, 1, '{HIGHLIGHT_START}', '{HIGHLIGHT_END}') AS niche, "
+                f"snippet(generation_fts, 2, '{HIGHLIGHT_START}', '{HIGHLIGHT_END}', '…', 24) AS snippet "
+                f"FROM generation_fts WHERE generation_fts MATCH :match{filters()} "
+                "ORDER BY bm25(generation_fts, 0.0, 4.0, 1.0) LIMIT :limit OFFSET :offset"
+            ), params).all()
+            return [(row.id, row.score, row.niche, row.snippet) for row in rows]
+
+        # Headlines are only built for the page of results, not every match
+        params.update(q=query, user_id=user_id, config=self.text_config)
+        headline_options = f"StartSel={HIGHLIGHT_START}, StopSel={HIGHLIGHT_END}"
+        rows = connection.execute(text(
+            "WITH q AS (SELECT websearch_to_tsquery(CAST(:config AS regconfig), :q) || "
+            "websearch_to_tsquery('simple', :q) AS query), "
+            "page AS (SELECT s.generation_id, ts_rank_cd(s.document, q.query) AS score "
+            "FROM generation_search s, q WHERE s.user_id = :user_id AND s.document @@ q.query"
+            f"{filters('s.')} "
+            "ORDER BY score DESC, s.generation_id DESC LIMIT :limit OFFSET :offset) "
+            "SELECT page.generation_id AS id, page.score, "
+            f"ts_headline(CAST(:config AS regconfig), coalesce(g.niche, ''), q.query, "
+            f"'HighlightAll=true, {headline_options}') AS niche, "
+            f"ts_headline(CAST(:config AS regconfig), coalesce(g.response, ''), q.query, "
+            f"'MaxFragments=2, MaxWords=30, MinWords=10, {headline_options}') AS snippet "
+            "FROM page JOIN generation g ON g.id = page.generation_id, q "
+            "ORDER BY page.score DESC, page.generation_id DESC"
+        ), params).all()
+        return [(row.id, row.score, row.niche, row.snippet) for row in rows]
+
+    def reindex(self, engine, batch_size=500, progress=None):
+        """Rebuild the index from the generation table; returns the number of rows indexed"""
+        if not self.create_schema(engine):
+            raise RuntimeError(f"Full-text search is not supported on {engine.dialect.name}")
+
+        table = Generation.__table__
+        columns = [table.c.id, table.c.user_id, table.c.niche, table.c.engine, table.c.language, table.c.response]
+        if 'response_compressed' in [column['name'] for column in inspect(engine).get_columns('generation')]:
+            columns.append(table.c.response_compressed)
+        select_batch = table.select() \
+            .with_only_columns(*columns) \
+            .where(table.c.id > bindparam('last_id')) \
+            .order_by(table.c.id) \
+            .limit(batch_size)
+
+        with engine.begin() as conn:
+            conn.execute(text(f"DELETE FROM {self.TABLES[engine.dialect.name]}"))
+
+        last_id = 0
+        indexed = 0
+        while True:
+            with engine.begin() as conn:
+                rows = conn.execute(select_batch, {'last_id': last_id}).all()
+                if not rows:
+                    break
+                self.add(conn, [_index_row(row._mapping) for row in rows])
+            last_id = rows[-1].id
+            indexed += len(rows)
+            if progress:
+                progress(indexed, last_id)
+        return indexed
+
+    def _config_for(self, language):
+        # Postgres ships no Bangla stemmer; index those rows word for word
+        return 'simple' if language == 'bn' else self.text_config
+
+def highlight_text(content, query, width=None):
+    """Mark the query's words in content, optionally cut to a window around the first match
+
+    Used where the database can't build the snippet itself (compressed rows,
+    the LIKE fallback).
+    """
+    if not content:
+        return content
+    words = [re.escape(word) for word in query.split() if word]
+    if not words:
+        return content[:width] if width else content
+    pattern = re.compile('|'.join(words), re.IGNORECASE)
+    if width:
+        match = pattern.search(content)
+        start = max(0, match.start() - width // 3) if match else 0
+        excerpt = content[start:start + width]
+        content = ('…' if start else '') + excerpt + ('…' if start + width < len(content) else '')
+    return pattern.sub(lambda m: f"{HIGHLIGHT_START}{m.group(0)}{HIGHLIGHT_END}", content)
+
+def _owner_token(user_id):
+    return f"u{user_id}"
+
+def _fts5_terms(query):
+    """Quote each whitespace-separated word so user input can't use FTS5 query syntax"""
+    words = [word for word in query.split() if any(char.isalnum() for char in word)]
+    return ' '.join('"' + word.replace('"', '""') + '"' for word in words)
+
+def _index_row(mapping):
+    response = mapping['response']
+    if response is None:
+        response = mapping.get('response_compressed')
+    return {
+        'id': mapping['id'],
+        'user_id': mapping['user_id'],
+        'niche': mapping['niche'],
+        'response': response,
+        'engine': mapping['engine'],
+        'language': mapping['language'],
+    }
+
+search_index = SearchIndex()
+
+@event.listens_for(Generation, 'after_insert')
+def _index_generation(mapper, connection, target):
+    if search_index.is_ready(connection):
+        search_index.add(connection, [_index_row({
+            'id': target.id,
+            'user_id': target.user_id,
+            'niche': target.niche,
+            'response': target.response,
+            'engine': target.engine,
+            'language': target.language,
+        })])
+
+@event.listens_for(Generation, 'after_update')
+def _reindex_generation(mapper, connection, target):
+    state = inspect(target)
+    changed = any(state.attrs[name].history.has_changes()
+                  for name in ('niche', '_response', 'response_compressed', 'engine', 'language'))
+    if changed:
+        _index_generation(mapper, connection, target)
+
+@event.listens_for(Generation, 'after_delete')
+def _unindex_generation(mapper, connection, target):
+    if search_index.is_ready(connection):
+        search_index.remove(connection, target.id)
@@ -0,0 +1,180 @@
+import secrets
+from datetime import datetime
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SecureCookieSession, SessionInterface, SessionMixin
+from werkzeug.datastructures import CallbackDict
+from app.utils.purge import PeriodicPurge, delete_in_batches
+from app.utils.token_store import hash_token
+
+class StoredSession(CallbackDict, SessionMixin):
+    """Session dict whose data lives server-side under a random session id"""
+
+    def __init__(self, initial=None, sid=None, expires_at=None):
+        def on_update(self):
+            self.modified = True
+
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.new = sid is None
+        self.expires_at = expires_at
+        self.modified = False
+
+class RequestOnlySession(SecureCookieSession):
+    """Empty session for API token requests; never loaded or saved"""
+
+class SqlAlchemySessionInterface(SessionInterface):
+    """Sessions in the server_session table, shared by every worker and instance
+
+    The cookie carries only a random session id; the table stores its sha256
+    with the tagged-JSON data and an expiry. Unchanged sessions are only
+    written back once less than half their lifetime is left, so most requests
+    cost a single indexed read. Expired rows are purged in batches every
+    SESSION_PURGE_INTERVAL seconds.
+    """
+
+    serializer = TaggedJSONSerializer()
+
+    def __init__(self, app):
+        self.app = app
+        self.purge_batch_size = app.config.get('SESSION_PURGE_BATCH_SIZE', 500)
+        self._purge = PeriodicPurge(
+            self.purge_expired, 'expired sessions', app.config.get('SESSION_PURGE_INTERVAL', 3600), app.logger
+        )
+
+    @property
+    def _table(self):
+        from app.models import ServerSession
+        return ServerSession.__table__
+
+    def _engine(self):
+        from app import db
+        with self.app.app_context():
+            return db.engine
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if not sid:
+            return StoredSession()
+
+        table = self._table
+        try:
+            with self._engine().connect() as conn:
+                row = conn.execute(
+                    table.select()
+                    .with_only_columns(table.c.data, table.c.expires_at)
+                    .where(table.c.session_id == hash_token(sid))
+                    .where(table.c.expires_at > datetime.utcnow())
+                ).first()
+            if row is not None:
+                return StoredSession(self.serializer.loads(row.data), sid, row.expires_at)
+        except Exception as e:
+            app.logger.error(f"Session load error: {str(e)}")
+        return StoredSession()
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        if not session:
+            if session.modified and not session.new:
+                self._delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+
+        lifetime = app.permanent_session_lifetime
+        expires_at = datetime.utcnow() + lifetime
+        stale = session.expires_at is None or session.expires_at - datetime.utcnow() < lifetime / 2
+        if not session.modified and not stale:
+            return
+
+        if session.new:
+            session.sid = secrets.token_urlsafe(32)
+        self._store(session.sid, self.serializer.dumps(dict(session)), expires_at)
+
+        response.set_cookie(
+            name,
+            session.sid,
+            expires=self.get_expiration_time(app, session),
+            httponly=self.get_cookie_httponly(app),
+            domain=domain,
+            path=path,
+            secure=self.get_cookie_secure(app),
+            samesite=self.get_cookie_samesite(app)
+        )
+        if session.new:
+            self._purge.maybe_run()
+
+    def _store(self, sid, data, expires_at):
+        table = self._table
+        session_id = hash_token(sid)
+        with self._engine().begin() as conn:
+            updated = conn.execute(
+                table.update()
+                .where(table.c.session_id == session_id)
+                .values(data=data, expires_at=expires_at)
+            ).rowcount
+            if not updated:
+                conn.execute(table.insert().values(session_id=session_id, data=data, expires_at=expires_at))
+
+    def _delete(self, sid):
+        table = self._table
+        with self._engine().begin() as conn:
+            conn.execute(table.delete().where(table.c.session_id == hash_token(sid)))
+
+    def purge_expired(self):
+        """Delete expired sessions in batches and return the number removed"""
+        table = self._table
+        return delete_in_batches(
+            self._engine(), table, table.c.expires_at <= datetime.utcnow(), self.purge_batch_size
+        )
+
+class SkipForApiTokens(SessionInterface):
+    """Wraps a session interface so requests carrying X-API-Token never touch it
+
+    Token-authenticated API clients don't use the session, so they get an
+    empty request-only session instead of a backend read (and write).
+    """
+
+    def __init__(self, inner):
+        self.inner = inner
+
+    def open_session(self, app, request):
+        if request.headers.get('X-API-Token'):
+            return RequestOnlySession()
+        return self.inner.open_session(app, request)
+
+    def save_session(self, app, session, response):
+        if isinstance(session, RequestOnlySession):
+            return
+        return self.inner.save_session(app, session, response)
+
+    def make_null_session(self, app):
+        return self.inner.make_null_session(app)
+
+    def is_null_session(self, obj):
+        return self.inner.is_null_session(obj)
+
+    def end_session(self, app, request, response):
+        """Delete the cookie's stored session, which open_session skipped for this request"""
+        stored = self.inner.open_session(app, request)
+        if stored:
+            stored.clear()
+            self.inner.save_session(app, stored, response)
+
+def init_app(app, filesystem_session=None):
+    """Install the session backend named by SESSION_BACKEND
+
+    sqlalchemy: server_session table (the default)
+    cookie:     Flask's signed cookie sessions; no server state at all
+    filesystem: Flask-Session's file store (per host, the previous behaviour)
+    """
+    backend = app.config.get('SESSION_BACKEND', 'sqlalchemy')
+    if backend == 'sqlalchemy':
+        app.session_interface = SqlAlchemySessionInterface(app)
+    elif backend == 'filesystem':
+        filesystem_session.init_app(app)
+    elif backend != 'cookie':
+        raise ValueError(f"Unknown SESSION_BACKEND '{backend}'")
+
+    app.session_interface = SkipForApiTokens(app.session_interface)
@@ -0,0 +1,150 @@
+import hashlib
+import os
+import threading
+import time
+from app.utils.metrics import COALESCED_REQUESTS
+
+try:
+    import fcntl
+except ImportError:  # Windows has no flock; coalescing stays per worker
+    fcntl = None
+
+_LOCK_POLL_INTERVAL = 0.1  # seconds between attempts on a contended lock file
+
+class _Call:
+    """One in-flight execution that followers wait on"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class _FileLock:
+    """Exclusive flock on a per-key file, shared by every worker on the host
+
+    The holder unlinks the file before unlocking, so a waiter that wins the
+    lock on an unlinked file retries on the current one instead.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.fd = None
+        self.waited = False
+
+    def acquire(self, timeout):
+        """Return True once the lock is held, or False after timeout seconds"""
+        deadline = time.monotonic() + timeout
+        while True:
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                while True:
+                    try:
+                        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                        break
+                    except BlockingIOError:
+                        self.waited = True
+                        if time.monotonic() >= deadline:
+                            os.close(fd)
+                            return False
+                        time.sleep(_LOCK_POLL_INTERVAL)
+
+                try:
+                    if os.fstat(fd).st_ino == os.stat(self.path).st_ino:
+                        self.fd = fd
+                        return True
+                except FileNotFoundError:
+                    pass
+            except BaseException:
+                os.close(fd)
+                raise
+            os.close(fd)
+
+    def release(self):
+        if self.fd is None:
+            return
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+        fcntl.flock(self.fd, fcntl.LOCK_UN)
+        os.close(self.fd)
+        self.fd = None
+
+class SingleFlight:
+    """Collapse concurrent identical calls into one execution
+
+    Within a worker, callers that arrive while a call for the same key is
+    running wait for it and share its result (or its exception). Across
+    workers on one host, the running caller holds a lock file for the key;
+    callers in other workers wait on the lock and then ask `recheck` for the
+    result the first worker published (e.g. to the persistent response cache)
+    before falling back to running the call themselves.
+    """
+
+    def __init__(self):
+        self.enabled = True
+        self.wait_timeout = 90
+        self.lock_dir = None
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.enabled = app.config.get('COALESCE_ENABLED', True)
+        self.wait_timeout = app.config.get('COALESCE_WAIT_TIMEOUT', self.wait_timeout)
+        if app.config.get('COALESCE_CROSS_WORKER', True) and fcntl is not None:
+            self.lock_dir = app.config.get('COALESCE_LOCK_DIR') or os.path.join(app.instance_path, 'locks')
+            os.makedirs(self.lock_dir, exist_ok=True)
+
+    def do(self, key, fn, recheck=None):
+        """Run fn() at most once at a time per key; returns (result, shared)
+
+        shared is True when the result came from another caller's execution.
+        """
+        if not self.enabled:
+            return fn(), False
+
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            COALESCED_REQUESTS.inc(scope='worker')
+            if call.done.wait(self.wait_timeout):
+                if call.error is not None:
+                    raise call.error
+                return call.result, True
+            # The running call is stuck; don't hold this request hostage to it
+            return fn(), False
+
+        try:
+            call.result, shared = self._run(key, fn, recheck)
+            return call.result, shared
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+
+    def _run(self, key, fn, recheck):
+        if self.lock_dir is None or recheck is None:
+            return fn(), False
+
+        name = hashlib.sha256(key.encode('utf-8')).hexdigest()
+        lock = _FileLock(os.path.join(self.lock_dir, f"{name}.lock"))
+        acquired = lock.acquire(self.wait_timeout)
+        try:
+            if lock.waited:
+                result = recheck()
+                if result is not None:
+                    COALESCED_REQUESTS.inc(scope='host')
+                    return result, True
+            return fn(), False
+        finally:
+            if acquired:
+                lock.release()
+
+single_flight = SingleFlight()
@@ -0,0 +1,221 @@
+import calendar
+import hashlib
+import os
+import secrets
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta
+from app.utils.cache import LRUCache
+from app.utils.purge import PeriodicPurge
+
+def hash_token(token):
+    """Tokens are only ever stored and looked up by their sha256 digest"""
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+class TokenStore(ABC):
+    """Interface for API token backends
+
+    Backends deal in token hashes and absolute expiry times; hashing, caching
+    and purge scheduling live in TokenManager so every backend gets them.
+    """
+
+    @abstractmethod
+    def save(self, token_hash, user_id, expires_at):
+        pass
+
+    @abstractmethod
+    def lookup(self, token_hash):
+        """Return (user_id, expires_at) for an unexpired token, or None"""
+
+    @abstractmethod
+    def delete(self, token_hash):
+        pass
+
+    @abstractmethod
+    def purge_expired(self, batch_size):
+        """Delete up to batch_size expired tokens and return how many were removed"""
+
+class DatabaseTokenStore(TokenStore):
+    """Tokens in the application database (api_token table)
+
+    Uses short transactions on their own connection so token writes never
+    interfere with the caller's ORM session.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    @property
+    def _table(self):
+        from app.models import ApiToken
+        return ApiToken.__table__
+
+    def _engine(self):
+        from app import db
+        with self.app.app_context():
+            return db.engine
+
+    def save(self, token_hash, user_id, expires_at):
+        with self._engine().begin() as conn:
+            conn.execute(self._table.insert().values(
+                token_hash=token_hash,
+                user_id=user_id,
+                created_at=datetime.utcnow(),
+                expires_at=expires_at
+            ))
+
+    def lookup(self, token_hash):
+        table = self._table
+        with self._engine().connect() as conn:
+            row = conn.execute(
+                table.select()
+                .with_only_columns(table.c.user_id, table.c.expires_at)
+                .where(table.c.token_hash == token_hash)
+                .where(table.c.expires_at > datetime.utcnow())
+            ).first()
+        return (row.user_id, row.expires_at) if row else None
+
+    def delete(self, token_hash):
+        table = self._table
+        with self._engine().begin() as conn:
+            conn.execute(table.delete().where(table.c.token_hash == token_hash))
+
+    def purge_expired(self, batch_size):
+        table = self._table
+        with self._engine().begin() as conn:
+            expired_ids = table.select() \
+                .with_only_columns(table.c.id) \
+                .where(table.c.expires_at <= datetime.utcnow()) \
+                .limit(batch_size) \
+                .scalar_subquery()
+            result = conn.execute(table.delete().where(table.c.id.in_(expired_ids)))
+        return result.rowcount
+
+class SqliteTokenStore(TokenStore):
+    """Tokens in a standalone SQLite file shared by all workers on one host"""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        # A throwaway connection, so a gunicorn master preloading the app never
+        # hands an open SQLite handle to its forked workers
+        conn = sqlite3.connect(self.path, timeout=5)
+        try:
+            with conn:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS api_token ("
+                    "token_hash TEXT PRIMARY KEY, user_id INTEGER NOT NULL, expires_at REAL NOT NULL)"
+                )
+                conn.execute("CREATE INDEX IF NOT EXISTS ix_api_token_expires_at ON api_token (expires_at)")
+        finally:
+            conn.close()
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def save(self, token_hash, user_id, expires_at):
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO api_token (token_hash, user_id, expires_at) VALUES (?, ?, ?)",
+                (token_hash, user_id, calendar.timegm(expires_at.utctimetuple()))
+            )
+
+    def lookup(self, token_hash):
+        row = self._connect().execute(
+            "SELECT user_id, expires_at FROM api_token WHERE token_hash = ? AND expires_at > ?",
+            (token_hash, time.time())
+        ).fetchone()
+        return (row[0], datetime.utcfromtimestamp(row[1])) if row else None
+
+    def delete(self, token_hash):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM api_token WHERE token_hash = ?", (token_hash,))
+
+    def purge_expired(self, batch_size):
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "DELETE FROM api_token WHERE token_hash IN "
+                "(SELECT token_hash FROM api_token WHERE expires_at <= ? LIMIT ?)",
+                (time.time(), batch_size)
+            )
+        return cursor.rowcount
+
+class TokenManager:
+    """Issues and validates API tokens against the configured TokenStore
+
+    A small per-worker LRU sits in front of the store so repeated requests with
+    the same token skip the backend. Revocation clears this worker's entry
+    immediately; other workers drop theirs within TOKEN_CACHE_TTL seconds.
+    """
+
+    def __init__(self):
+        self.store = None
+        self.ttl = 7 * 86400
+        self.purge_batch_size = 500
+        self._cache = LRUCache(1024, 60)
+        self._purge = PeriodicPurge(self.purge_expired, 'expired API tokens')
+
+    def init_app(self, app):
+        self.ttl = app.config.get('TOKEN_TTL', self.ttl)
+        self.purge_batch_size = app.config.get('TOKEN_PURGE_BATCH_SIZE', self.purge_batch_size)
+        self._cache = LRUCache(app.config.get('TOKEN_CACHE_SIZE', 1024), app.config.get('TOKEN_CACHE_TTL', 60))
+        self._purge = PeriodicPurge(
+            self.purge_expired, 'expired API tokens', app.config.get('TOKEN_PURGE_INTERVAL', 3600), app.logger
+        )
+
+        backend = app.config.get('TOKEN_BACKEND', 'database')
+        if backend == 'sqlite':
+            path = app.config.get('TOKEN_SQLITE_PATH') or os.path.join(app.instance_path, 'tokens.db')
+            self.store = SqliteTokenStore(path)
+        elif backend == 'database':
+            self.store = DatabaseTokenStore(app)
+        else:
+            raise ValueError(f"Unknown TOKEN_BACKEND '{backend}'")
+
+    def issue(self, user_id):
+        """Create a new token for user_id and return it"""
+        token = secrets.token_urlsafe(32)
+        expires_at = datetime.utcnow() + timedelta(seconds=self.ttl)
+        self.store.save(hash_token(token), user_id, expires_at)
+        self._purge.maybe_run()
+        return token
+
+    def validate(self, token):
+        """Return the user id for a valid token, or None"""
+        token_hash = hash_token(token)
+        entry = self._cache.get(token_hash)
+        if entry is None:
+            entry = self.store.lookup(token_hash)
+            if entry is None:
+                return None
+            self._cache.set(token_hash, entry)
+
+        user_id, expires_at = entry
+        if expires_at <= datetime.utcnow():
+            self._cache.delete(token_hash)
+            return None
+        return user_id
+
+    def revoke(self, token):
+        token_hash = hash_token(token)
+        self._cache.delete(token_hash)
+        self.store.delete(token_hash)
+
+    def purge_expired(self):
+        """Delete all expired tokens in batches and return the number removed"""
+        total = 0
+        while True:
+            removed = self.store.purge_expired(self.purge_batch_size)
+            total += removed
+            if removed < self.purge_batch_size:
+                return total
+
+token_manager = TokenManager()
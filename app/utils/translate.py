@@ -1,55 +1,213 @@
-import argostranslate.package
-import argostranslate.translate
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from flask import current_app
+from app.utils.cache import LRUCache
 
-def translate_to_bangla(content):
-    """Translate content from English to Bangla using argostranslate"""
-    try:
-        # Check if packages are installed
-        installed_languages = argostranslate.translate.get_installed_languages()
-        from_lang = next((lang for lang in installed_languages if lang.code == "en"), None)
-        to_lang = next((lang for lang in installed_languages if lang.code == "bn"), None)
-
-        if not from_lang or not to_lang:
-            # Try to install required packages
-            current_app.logger.info("Required language packages not found. Attempting to install...")
-            try_install_language_packages()
-            
-            # Check again after installation
-            installed_languages = argostranslate.translate.get_installed_languages()
-            from_lang = next((lang for lang in installed_languages if lang.code == "en"), None)
-            to_lang = next((lang for lang in installed_languages if lang.code == "bn"), None)
-            
+# Split points are kept in the output so paragraph and sentence layout survives translation
+_LINE_SPLIT = re.compile(r'(\n+)')
+_SENTENCE_SPLIT = re.compile(r'(?<=[.!?])(\s+)')
+
+class TranslationError(Exception):
+    """Raised when content could not be translated"""
+
+class TranslationService:
+    """Resident en->bn translator with segment-level caching
+
+    argostranslate (and its ML stack) is only imported when the model is first
+    loaded, which happens once (in the background at startup when
+    TRANSLATION_WARMUP is set) and is kept for the life of the worker. Missing
+    language packages are downloaded by `flask install-translation` or the
+    warm-up, never from a request unless TRANSLATION_AUTO_INSTALL is set. Content is
+    split into sentences, repeated sentences are served from an LRU cache, and
+    the remainder is translated in batches across a small thread pool.
+    """
+
+    def __init__(self, from_code='en', to_code='bn'):
+        self.from_code = from_code
+        self.to_code = to_code
+        self.auto_install = False
+        self.batch_size = 8
+        self.retry_interval = 300
+        self._translation = None
+        self._failed_at = None
+        self._load_lock = threading.Lock()
+        self._cache = LRUCache(4096)
+        self._executor = None
+        self._workers = 2
+        self._logger = None
+
+    def init_app(self, app):
+        self.auto_install = app.config.get('TRANSLATION_AUTO_INSTALL', False)
+        self.batch_size = app.config.get('TRANSLATION_BATCH_SIZE', self.batch_size)
+        self.retry_interval = app.config.get('TRANSLATION_RETRY_INTERVAL', self.retry_interval)
+        self._workers = app.config.get('TRANSLATION_WORKERS', self._workers)
+        self._cache = LRUCache(app.config.get('TRANSLATION_CACHE_SIZE', 4096))
+        self._logger = app.logger
+
+        if app.config.get('TRANSLATION_WARMUP', False):
+            threading.Thread(target=self._warm_up, name='translation-warmup', daemon=True).start()
+
+    @property
+    def loaded(self):
+        return self._translation is not None
+
+    def load(self, install=None):
+        """Load the translation model, installing the language package if allowed
+
+        install defaults to TRANSLATION_AUTO_INSTALL.
+        """
+        if install is None:
+            install = self.auto_install
+        if self._translation is not None:
+            return self._translation
+
+        with self._load_lock:
+            if self._translation is not None:
+                return self._translation
+
+            # Don't repeat a failed package lookup/install on every request
+            if self._failed_at is not None and time.monotonic() - self._failed_at < self.retry_interval:
+                raise TranslationError("Translation model unavailable")
+
+            from_lang, to_lang = self._find_languages(install)
             if not from_lang or not to_lang:
-                current_app.logger.error("Could not install required language packages")
-                return content
+                self._failed_at = time.monotonic()
+                if install:
+                    raise TranslationError("Could not install required language packages")
+                raise TranslationError("Translation packages not installed; run `flask install-translation`")
+
+            self._translation = from_lang.get_translation(to_lang)
+            self._log_info(f"Loaded {self.from_code}->{self.to_code} translation model")
+            return self._translation
+
+    def translate(self, content):
+        """Translate content sentence by sentence, reusing cached segments"""
+        if not content or not content.strip():
+            return content
+
+        translation = self.load()
+        parts = _split_segments(content)
+
+        # Only translate each distinct, uncached sentence once
+        pending = []
+        seen = set()
+        for part in parts:
+            if part.strip() and part not in seen and self._cache.get(part) is None:
+                seen.add(part)
+                pending.append(part)
 
-        translation = from_lang.get_translation(to_lang)
-        return translation.translate(content)
+        if pending:
+            batches = [pending[i:i + self.batch_size] for i in range(0, len(pending), self.batch_size)]
+            if len(batches) == 1:
+                self._translate_batch(translation, batches[0])
+            else:
+                list(self._get_executor().map(lambda batch: self._translate_batch(translation, batch), batches))
+
+        translated = []
+        for part in parts:
+            if not part.strip():
+                translated.append(part)
+                continue
+            segment = self._cache.get(part)
+            if segment is None:
+                # Evicted between batching and assembly; translate inline
+                segment = translation.translate(part)
+                self._cache.set(part, segment)
+            translated.append(segment)
+        return "".join(translated)
+
+    def _translate_batch(self, translation, segments):
+        for segment in segments:
+            self._cache.set(segment, translation.translate(segment))
+
+    def install(self):
+        """Download the language packages if they're missing; returns True once they're installed"""
+        from_lang, to_lang = self._find_languages(install=True)
+        return bool(from_lang and to_lang)
+
+    def _find_languages(self, install=False):
+        import argostranslate.translate
+        installed_languages = argostranslate.translate.get_installed_languages()
+        from_lang = next((lang for lang in installed_languages if lang.code == self.from_code), None)
+        to_lang = next((lang for lang in installed_languages if lang.code == self.to_code), None)
+        if (not from_lang or not to_lang) and install:
+            self._log_info("Required language packages not found. Attempting to install...")
+            try_install_language_packages(self._logger)
+            return self._find_languages()
+        return from_lang, to_lang
+
+    def _get_executor(self):
+        if self._executor is None:
+            with self._load_lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self._workers,
+                        thread_name_prefix='translation'
+                    )
+        return self._executor
+
+    def _warm_up(self):
+        try:
+            self.load(install=True)
+        except Exception as e:
+            if self._logger:
+                self._logger.error(f"Translation warm-up failed: {str(e)}")
+
+    def _log_info(self, message):
+        if self._logger:
+            self._logger.info(message)
+
+def _split_segments(content):
+    """Split content into sentences, keeping newline and whitespace separators as their own parts"""
+    parts = []
+    for block in _LINE_SPLIT.split(content):
+        if not block or block.startswith('\n'):
+            parts.append(block)
+            continue
+        parts.extend(_SENTENCE_SPLIT.split(block))
+    return [part for part in parts if part]
+
+translation_service = TranslationService()
+
+def translate_to_bangla(content, raise_errors=False):
+    """Translate content from English to Bangla using argostranslate
+
+    On failure the original content is returned unless raise_errors is set,
+    in which case a TranslationError is raised instead.
+    """
+    try:
+        return translation_service.translate(content)
     except Exception as e:
         current_app.logger.error(f"Translation error: {str(e)}")
+        if raise_errors:
+            raise TranslationError(str(e)) from e
         return content
 
-def try_install_language_packages():
+def try_install_language_packages(logger=None):
     """Attempt to download and install en-bn translation packages"""
+    logger = logger or current_app.logger
     try:
+        import argostranslate.package
+
         # Update package index
         argostranslate.package.update_package_index()
-        
+
         # Get available packages
         available_packages = argostranslate.package.get_available_packages()
-        
+
         # Find the en-bn package
         en_bn_package = next(
-            (pkg for pkg in available_packages if pkg.from_code == "en" and pkg.to_code == "bn"), 
+            (pkg for pkg in available_packages if pkg.from_code == "en" and pkg.to_code == "bn"),
             None
         )
-        
+
         if en_bn_package:
             # Download and install
             argostranslate.package.install_from_path(en_bn_package.download())
-            current_app.logger.info("Successfully installed en-bn translation package")
+            logger.info("Successfully installed en-bn translation package")
         else:
-            current_app.logger.error("en-bn translation package not found in package index")
+            logger.error("en-bn translation package not found in package index")
     except Exception as e:
-        current_app.logger.error(f"Error installing language packages: {str(e)}")
\ No newline at end of file
+        logger.error(f"Error installing language packages: {str(e)}")
@@ -0,0 +1,151 @@
+"""Local stand-in for the Ollama and OpenAI HTTP APIs
+
+Serves just enough of both APIs for the app's engine clients:
+
+    GET  /api/version            Ollama liveness probe
+    POST /api/generate           Ollama generation (streaming and non-streaming)
+    POST /v1/chat/completions    OpenAI chat completions (streaming and non-streaming)
+
+Every response waits `latency` seconds (time to first token) and then emits
+`tokens` tokens at `token_rate` tokens per second, so benchmarks can model a
+slow GPU box or a fast hosted API without either being present.
+"""
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+class FakeLLMServer:
+    def __init__(self, host='127.0.0.1', port=0, latency=0.5, token_rate=50.0, tokens=200):
+        self.latency = latency
+        self.token_rate = token_rate
+        self.tokens = tokens
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name='fake-llm', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def token_stream(self):
+        """Yield tokens paced like a real model"""
+        time.sleep(self.latency)
+        interval = 1.0 / self.token_rate if self.token_rate else 0
+        for i in range(self.tokens):
+            if interval:
+                time.sleep(interval)
+            yield f"token{i} "
+
+    def _count(self):
+        with self._lock:
+            self.requests += 1
+
+    def _handler_class(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                if self.path == '/api/version':
+                    self._send_json({'version': 'fake'})
+                else:
+                    self._send_json({'error': 'not found'}, 404)
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                body = json.loads(self.rfile.read(length) or b'{}')
+                fake._count()
+
+                if self.path == '/api/generate':
+                    self._ollama(body)
+                elif self.path.rstrip('/').endswith('/chat/completions'):
+                    self._openai(body)
+                else:
+                    self._send_json({'error': 'not found'}, 404)
+
+            def _ollama(self, body):
+                if not body.get('stream', True):
+                    self._send_json({'model': body.get('model'), 'response': ''.join(fake.token_stream()), 'done': True})
+                    return
+
+                self._start_chunked('application/x-ndjson')
+                for token in fake.token_stream():
+                    self._write_chunk(json.dumps({'response': token, 'done': False}) + "\n")
+                self._write_chunk(json.dumps({'response': '', 'done': True}) + "\n")
+                self._end_chunked()
+
+            def _openai(self, body):
+                completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+                created = int(time.time())
+                model = body.get('model', 'fake')
+
+                if not body.get('stream'):
+                    self._send_json({
+                        'id': completion_id,
+                        'object': 'chat.completion',
+                        'created': created,
+                        'model': model,
+                        'choices': [{
+                            'index': 0,
+                            'message': {'role': 'assistant', 'content': ''.join(fake.token_stream())},
+                            'finish_reason': 'stop'
+                        }],
+                        'usage': {'prompt_tokens': 0, 'completion_tokens': fake.tokens, 'total_tokens': fake.tokens}
+                    })
+                    return
+
+                self._start_chunked('text/event-stream')
+                for token in fake.token_stream():
+                    chunk = {
+                        'id': completion_id,
+                        'object': 'chat.completion.chunk',
+                        'created': created,
+                        'model': model,
+                        'choices': [{'index': 0, 'delta': {'content': token}, 'finish_reason': None}]
+                    }
+                    self._write_chunk(f"data: {json.dumps(chunk)}\n\n")
+                self._write_chunk("data: [DONE]\n\n")
+                self._end_chunked()
+
+            def _send_json(self, payload, status=200):
+                data = json.dumps(payload).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _start_chunked(self, content_type):
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Transfer-Encoding', 'chunked')
+                self.end_headers()
+
+            def _write_chunk(self, text):
+                data = text.encode('utf-8')
+                self.wfile.write(f"{len(data):x}\r\n".encode('ascii') + data + b"\r\n")
+                self.wfile.flush()
+
+            def _end_chunked(self):
+                self.wfile.write(b"0\r\n\r\n")
+                self.wfile.flush()
+
+        return Handler
@@ -0,0 +1,232 @@
+"""Load and latency benchmark for the hot API paths
+
+Starts the app from create_app() on a throwaway SQLite database, points both
+engines at a local FakeLLMServer, and drives the endpoints at each requested
+concurrency level. Reports p50/p95/p99 latency, throughput, errors and SQL
+queries per request for every endpoint. Needs no GPU and no network access.
+
+    python -m benchmarks.run
+    python -m benchmarks.run --concurrency 1,8,32 --requests 200 --latency 0.2 --token-rate 200
+    python -m benchmarks.run --endpoints generate,stream --engine openai --json results.json
+"""
+import argparse
+import json
+import math
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from benchmarks.fake_llm import FakeLLMServer
+
+ENDPOINTS = ('login', 'generate', 'history', 'stream', 'batch')
+CATEGORY = 'Men > Tops > T-Shirts > Graphic Tees'
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--endpoints', default=','.join(ENDPOINTS), help='comma separated subset of ' + ', '.join(ENDPOINTS))
+    parser.add_argument('--concurrency', default='1,8,32', help='comma separated client concurrency levels')
+    parser.add_argument('--requests', type=int, default=100, help='requests per endpoint per concurrency level')
+    parser.add_argument('--engine', choices=('ollama', 'openai'), default='ollama')
+    parser.add_argument('--latency', type=float, default=0.2, help='fake engine time to first token (seconds)')
+    parser.add_argument('--token-rate', type=float, default=200.0, help='fake engine tokens per second')
+    parser.add_argument('--tokens', type=int, default=100, help='tokens per fake completion')
+    parser.add_argument('--batch-size', type=int, default=10, help='items per /generate/batch request')
+    parser.add_argument('--cache', action='store_true', help='leave the response cache on and send identical prompts')
+    parser.add_argument('--json', dest='json_path', help='also write results to this file')
+    return parser.parse_args(argv)
+
+def configure_environment(args, fake_url, workdir):
+    """Config reads the environment at import time, so set it before importing the app"""
+    os.environ.update({
+        'DATABASE_URI': f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+        'OLLAMA_BASE_URL': fake_url,
+        'OPENAI_BASE_URL': f"{fake_url}/v1",
+        'OPENAI_API_KEY': 'benchmark',
+        'TRANSLATION_WARMUP': 'false',
+        'RESPONSE_CACHE_ENABLED': 'true' if args.cache else 'false',
+        'BATCH_MAX_ITEMS': str(max(args.batch_size, 50)),
+        'JOB_QUEUE_MAX': '100000',
+    })
+    os.environ.pop('DATABASE_URL', None)
+
+def build_app():
+    from sqlalchemy import event
+    from flask import has_request_context, request
+    from app import create_app, db
+
+    app = create_app()
+    app.config.update(RATE_LIMIT_DEFAULT=10 ** 9, RATE_LIMIT_PAID=10 ** 9, TESTING=True)
+
+    query_counts = {}
+    lock = threading.Lock()
+
+    with app.app_context():
+        db.create_all()
+
+        @event.listens_for(db.engine, 'before_cursor_execute')
+        def count_query(conn, cursor, statement, parameters, context, executemany):
+            if has_request_context():
+                with lock:
+                    query_counts[request.endpoint] = query_counts.get(request.endpoint, 0) + 1
+
+    return app, query_counts
+
+def start_server(app):
+    from werkzeug.serving import make_server
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, name='bench-app', daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+class Client:
+    """One simulated user with its own keep-alive session and API token"""
+
+    def __init__(self, base_url, index):
+        import requests
+        self.base_url = base_url
+        self.http = requests.Session()
+        self.email = f"bench{index}@example.com"
+        self.password = 'benchmark-password'
+        self.http.post(f"{base_url}/auth/register", json={'email': self.email, 'password': self.password})
+        self.login()
+
+    def login(self):
+        res = self.http.post(f"{self.base_url}/auth/login", json={'email': self.email, 'password': self.password})
+        res.raise_for_status()
+        self.http.headers['X-API-Token'] = res.json()['token']
+        return res
+
+    def generation_body(self, engine, n):
+        return {
+            'categories': [CATEGORY],
+            'color': 'Navy',
+            'additionalWords': f"organic, request {n}" if n is not None else 'organic',
+            'type': 'Product Description',
+            'engine': engine,
+        }
+
+def run_request(client, endpoint, args, n):
+    url = client.base_url
+    if args.cache:
+        n = None  # Identical prompts, so everything after the first request can hit the cache
+    if endpoint == 'login':
+        return client.login()
+    if endpoint == 'generate':
+        return client.http.post(f"{url}/generate/", json=client.generation_body(args.engine, n))
+    if endpoint == 'history':
+        return client.http.get(f"{url}/generate/history", params={'limit': 20, 'fields': 'id,niche,created_at'})
+    if endpoint == 'stream':
+        res = client.http.post(f"{url}/generate/stream", json=client.generation_body(args.engine, n), stream=True)
+        for _ in res.iter_lines():
+            pass
+        return res
+    if endpoint == 'batch':
+        items = [client.generation_body(args.engine, None if n is None else n * args.batch_size + i)
+                 for i in range(args.batch_size)]
+        return client.http.post(f"{url}/generate/batch", json={'items': items})
+    raise ValueError(f"Unknown endpoint {endpoint}")
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile"""
+    if not sorted_values:
+        return 0.0
+    index = max(0, math.ceil(pct / 100 * len(sorted_values)) - 1)
+    return sorted_values[index]
+
+def benchmark(endpoint, clients, concurrency, args, query_counts, endpoint_name):
+    latencies = []
+    errors = 0
+    lock = threading.Lock()
+
+    def one(n):
+        nonlocal errors
+        client = clients[n % concurrency]
+        start = time.perf_counter()
+        try:
+            res = run_request(client, endpoint, args, n)
+            ok = res.status_code < 400
+        except Exception:
+            ok = False
+        elapsed = time.perf_counter() - start
+        with lock:
+            latencies.append(elapsed)
+            if not ok:
+                errors += 1
+
+    queries_before = query_counts.get(endpoint_name, 0)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(args.requests)))
+    wall = time.perf_counter() - start
+    queries = query_counts.get(endpoint_name, 0) - queries_before
+
+    latencies.sort()
+    return {
+        'endpoint': endpoint,
+        'concurrency': concurrency,
+        'requests': args.requests,
+        'errors': errors,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 1),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 1),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 1),
+        'throughput_rps': round(args.requests / wall, 2) if wall else 0.0,
+        'queries_per_request': round(queries / args.requests, 2) if args.requests else 0.0,
+    }
+
+# Flask endpoint names, used to attribute SQL queries
+ENDPOINT_NAMES = {
+    'login': 'auth.login',
+    'generate': 'generate.generate_content_endpoint',
+    'history': 'generate.get_history',
+    'stream': 'generate.stream_content_endpoint',
+    'batch': 'generate.generate_batch_endpoint',
+}
+
+def print_table(results):
+    columns = ('endpoint', 'concurrency', 'requests', 'errors', 'p50_ms', 'p95_ms', 'p99_ms', 'throughput_rps', 'queries_per_request')
+    widths = [max(len(column), *(len(str(row[column])) for row in results)) for column in columns]
+    print('  '.join(column.ljust(width) for column, width in zip(columns, widths)))
+    for row in results:
+        print('  '.join(str(row[column]).ljust(width) for column, width in zip(columns, widths)))
+
+def main(argv=None):
+    args = parse_args(argv)
+    endpoints = [endpoint.strip() for endpoint in args.endpoints.split(',') if endpoint.strip()]
+    unknown = [endpoint for endpoint in endpoints if endpoint not in ENDPOINTS]
+    if unknown:
+        raise SystemExit(f"Unknown endpoints: {', '.join(unknown)}")
+    levels = [int(level) for level in args.concurrency.split(',')]
+
+    fake = FakeLLMServer(latency=args.latency, token_rate=args.token_rate, tokens=args.tokens).start()
+    workdir = tempfile.mkdtemp(prefix='nichegen-bench-')
+    configure_environment(args, fake.url, workdir)
+
+    app, query_counts = build_app()
+    server, base_url = start_server(app)
+
+    try:
+        clients = [Client(base_url, index) for index in range(max(levels))]
+        results = []
+        for endpoint in endpoints:
+            for concurrency in levels:
+                result = benchmark(endpoint, clients, concurrency, args, query_counts, ENDPOINT_NAMES[endpoint])
+                results.append(result)
+                print(f"{endpoint} @ {concurrency}: p50 {result['p50_ms']}ms p95 {result['p95_ms']}ms "
+                      f"{result['throughput_rps']} req/s", file=sys.stderr)
+        print_table(results)
+
+        if args.json_path:
+            with open(args.json_path, 'w') as file:
+                json.dump({'settings': vars(args), 'results': results}, file, indent=2)
+    finally:
+        server.shutdown()
+        fake.stop()
+
+if __name__ == '__main__':
+    main()
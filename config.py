@@ -14,16 +14,165 @@ class Config:
     
     SQLALCHEMY_DATABASE_URI = DATABASE_URL or os.environ.get('DATABASE_URI') or 'sqlite:///nichegen.db'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    
+    # Serving profile (read by gunicorn.conf.py). gthread workers run GUNICORN_THREADS requests
+    # each, so a generation waiting on the LLM pins one thread instead of a whole process, and
+    # one instance holds GUNICORN_WORKERS * GUNICORN_THREADS requests in flight: 256 by default,
+    # all of which can be OpenAI generations at once (ENGINE_CONCURRENCY_OPENAI matches the
+    # thread count). A waiting thread is mostly an idle socket and its stack, so raise
+    # GUNICORN_THREADS together with ENGINE_CONCURRENCY_OPENAI for more. Ollama is capped far
+    # lower because one model server only runs a few generations in parallel; the excess waits
+    # up to ENGINE_QUEUE_TIMEOUT for a slot and then gets a 503. Everything shared inside a
+    # worker (engine clients, caches, limiters, queues) is thread-safe. 'sync' restores one
+    # request per process.
+    GUNICORN_WORKER_CLASS = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+    GUNICORN_WORKERS = int(os.environ.get('WEB_CONCURRENCY', 2))       # processes
+    GUNICORN_THREADS = int(os.environ.get('GUNICORN_THREADS', 128))    # request threads per process
+    GUNICORN_TIMEOUT = int(os.environ.get('GUNICORN_TIMEOUT', 120))    # seconds; above OLLAMA_READ_TIMEOUT
+    GUNICORN_KEEPALIVE = int(os.environ.get('GUNICORN_KEEPALIVE', 5))  # seconds
+    GUNICORN_PRELOAD = os.environ.get('GUNICORN_PRELOAD', 'false').lower() == 'true'
+    
+    # Database connection pool, per worker process. Request threads only hold a connection
+    # while they query, never across an engine call, so the pool can be far smaller than
+    # GUNICORN_THREADS; keep GUNICORN_WORKERS * (DB_POOL_SIZE + DB_MAX_OVERFLOW) under the
+    # database's connection limit (100 by default on Postgres)
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 10))
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 20))
+    DB_POOL_TIMEOUT = int(os.environ.get('DB_POOL_TIMEOUT', 10))     # seconds to wait for a free connection
+    DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', 1800))   # seconds; below server idle timeouts
+    SQLALCHEMY_ENGINE_OPTIONS = {'pool_pre_ping': True, 'pool_recycle': DB_POOL_RECYCLE}
+    if SQLALCHEMY_DATABASE_URI not in ('sqlite://', 'sqlite:///:memory:') and 'mode=memory' not in SQLALCHEMY_DATABASE_URI:
+        # In-memory SQLite uses a single shared connection, which takes no pool sizing
+        SQLALCHEMY_ENGINE_OPTIONS.update(pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW, pool_timeout=DB_POOL_TIMEOUT)
+    # Create missing tables when the app starts; otherwise run `flask --app run init-db`
+    AUTO_CREATE_SCHEMA = os.environ.get('AUTO_CREATE_SCHEMA', 'false').lower() == 'true'
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'supersecretkey'
     
+    # Password hashing: bcrypt cost (existing hashes are upgraded on login) and the
+    # per-worker pool that runs it, so login bursts queue instead of starving other requests
+    BCRYPT_LOG_ROUNDS = int(os.environ.get('BCRYPT_LOG_ROUNDS', 12))
+    PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', 2))   # concurrent hashes
+    PASSWORD_HASH_QUEUE = int(os.environ.get('PASSWORD_HASH_QUEUE', 32))      # waiting hashes before 503
+    PASSWORD_HASH_TIMEOUT = float(os.environ.get('PASSWORD_HASH_TIMEOUT', 5)) # seconds a hash may wait to start
+    
     # Session configuration
-    SESSION_TYPE = 'filesystem'
+    SESSION_BACKEND = os.environ.get('SESSION_BACKEND', 'sqlalchemy')  # 'sqlalchemy', 'cookie' or 'filesystem'
+    SESSION_TYPE = 'filesystem'  # Flask-Session store used by SESSION_BACKEND=filesystem
+    SESSION_PURGE_INTERVAL = int(os.environ.get('SESSION_PURGE_INTERVAL', 3600))  # seconds between expired-session purges
+    SESSION_PURGE_BATCH_SIZE = int(os.environ.get('SESSION_PURGE_BATCH_SIZE', 500))
     SESSION_PERMANENT = False
     PERMANENT_SESSION_LIFETIME = 1800  # 30 minutes
     
     # API Keys - load from environment
     OPENAI_API_KEY = os.environ.get('OPENAI_API_KEY')
     
+    # Engine models
+    OLLAMA_MODEL = os.environ.get('OLLAMA_MODEL', 'llama3.2:latest')
+    OPENAI_MODEL = os.environ.get('OPENAI_MODEL', 'gpt-4')
+    
+    # Engine clients (one pooled client per worker, reused across requests)
+    OLLAMA_BASE_URL = os.environ.get('OLLAMA_BASE_URL', 'http://localhost:11434')
+    OLLAMA_POOL_SIZE = int(os.environ.get('OLLAMA_POOL_SIZE', 10))              # keep-alive connections
+    OLLAMA_CONNECT_TIMEOUT = float(os.environ.get('OLLAMA_CONNECT_TIMEOUT', 5))  # seconds
+    OLLAMA_READ_TIMEOUT = float(os.environ.get('OLLAMA_READ_TIMEOUT', 60))       # seconds
+    OLLAMA_HEALTH_INTERVAL = int(os.environ.get('OLLAMA_HEALTH_INTERVAL', 30))   # seconds between background probes
+    OPENAI_BASE_URL = os.environ.get('OPENAI_BASE_URL')                          # None uses the official API
+    OPENAI_TIMEOUT = float(os.environ.get('OPENAI_TIMEOUT', 60))                 # seconds
+    OPENAI_MAX_RETRIES = int(os.environ.get('OPENAI_MAX_RETRIES', 0))            # SDK retries per call, each up to OPENAI_TIMEOUT
+    OPENAI_MAX_TOKENS = int(os.environ.get('OPENAI_MAX_TOKENS', 1500))
+    
+    # Engine routing (per worker): concurrency caps, circuit breaker and failover. The Ollama cap
+    # protects a single local model server; a waiting request only holds a gthread thread, so
+    # the queue timeout covers roughly one generation's turnaround rather than failing fast
+    ENGINE_CONCURRENCY_OLLAMA = int(os.environ.get('ENGINE_CONCURRENCY_OLLAMA', 4))    # concurrent calls
+    ENGINE_CONCURRENCY_OPENAI = int(os.environ.get('ENGINE_CONCURRENCY_OPENAI', 128))  # also the httpx pool size
+    ENGINE_QUEUE_TIMEOUT = float(os.environ.get('ENGINE_QUEUE_TIMEOUT', 30))          # seconds to wait for a free slot
+    ENGINE_BREAKER_THRESHOLD = int(os.environ.get('ENGINE_BREAKER_THRESHOLD', 5))     # consecutive failures to open
+    ENGINE_BREAKER_RESET = float(os.environ.get('ENGINE_BREAKER_RESET', 30))          # seconds before a trial call
+    ENGINE_FAILOVER = os.environ.get('ENGINE_FAILOVER', 'false').lower() == 'true'    # retry on the other engine
+    
     # Rate limiting
     RATE_LIMIT_DEFAULT = 10  # requests per hour for free users
-    RATE_LIMIT_PAID = 100    # requests per hour for paid users
\ No newline at end of file
+    RATE_LIMIT_PAID = 100    # requests per hour for paid users
+    RATE_LIMIT_WINDOW = 3600 # seconds for a bucket to refill completely
+    
+    # Background generation jobs (opt-in per request with "async": true). Jobs run on the worker
+    # that accepted them, with their status in the generation_job table so any worker can answer polls
+    JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 4))        # concurrent background generations
+    JOB_QUEUE_MAX = int(os.environ.get('JOB_QUEUE_MAX', 32))   # queued + running jobs per worker before rejecting
+    JOB_RETENTION = int(os.environ.get('JOB_RETENTION', 3600)) # seconds finished jobs stay pollable
+    JOB_PURGE_INTERVAL = int(os.environ.get('JOB_PURGE_INTERVAL', 600))  # seconds between finished-job purges
+    JOB_HEARTBEAT_INTERVAL = int(os.environ.get('JOB_HEARTBEAT_INTERVAL', 30))  # jobs missing 4 heartbeats are failed
+    
+    # Clothing category catalogue
+    CATEGORY_DATA_PATH = os.environ.get('CATEGORY_DATA_PATH')  # defaults to app/data/full_clothing_combinations.txt
+    CATEGORY_VALIDATION = os.environ.get('CATEGORY_VALIDATION', 'true').lower() == 'true'  # reject unknown categories
+    CATEGORY_CACHE_MAX_AGE = int(os.environ.get('CATEGORY_CACHE_MAX_AGE', 3600))  # seconds clients may cache the list
+    
+    # Store new generation responses zlib-compressed; `flask compress-responses`
+    # converts the rows stored before it was turned on
+    COMPRESS_RESPONSES = os.environ.get('COMPRESS_RESPONSES', 'false').lower() == 'true'
+    COMPRESSION_LEVEL = int(os.environ.get('COMPRESSION_LEVEL', 6))  # zlib level 1 (fast) - 9 (small)
+    
+    # History listing
+    HISTORY_MAX_PER_PAGE = int(os.environ.get('HISTORY_MAX_PER_PAGE', 100))
+    EXPORT_BATCH_SIZE = int(os.environ.get('EXPORT_BATCH_SIZE', 500))  # rows fetched per chunk by /history/export
+    
+    # Full-text search (/generate/search): SQLite FTS5 or a Postgres tsvector + GIN index.
+    # Created by `flask init-db`; rebuild with `flask reindex-search`. The SQLite FTS5 table
+    # keeps its own uncompressed copy of every response (snippets are cut from it), which
+    # cancels out COMPRESS_RESPONSES' savings there; Postgres only stores the tsvector. Without
+    # an index, search falls back to LIKE, which can't match inside compressed responses
+    SEARCH_ENABLED = os.environ.get('SEARCH_ENABLED', 'true').lower() == 'true'
+    SEARCH_TEXT_CONFIG = os.environ.get('SEARCH_TEXT_CONFIG', 'english')  # Postgres text search configuration
+    SEARCH_MAX_RESULTS = int(os.environ.get('SEARCH_MAX_RESULTS', 50))    # results per page
+    
+    # Batch generation (/generate/batch)
+    BATCH_MAX_ITEMS = int(os.environ.get('BATCH_MAX_ITEMS', 50))
+    BATCH_MAX_WORKERS = int(os.environ.get('BATCH_MAX_WORKERS', 16))              # threads per worker, shared by all batches
+    BATCH_CONCURRENCY_OLLAMA = int(os.environ.get('BATCH_CONCURRENCY_OLLAMA', 2))  # concurrent calls per worker
+    BATCH_CONCURRENCY_OPENAI = int(os.environ.get('BATCH_CONCURRENCY_OPENAI', 8))
+    
+    # Response cache for identical prompts
+    RESPONSE_CACHE_ENABLED = os.environ.get('RESPONSE_CACHE_ENABLED', 'true').lower() == 'true'
+    RESPONSE_CACHE_SIZE = int(os.environ.get('RESPONSE_CACHE_SIZE', 1024))   # in-memory entries per worker
+    RESPONSE_CACHE_TTL = int(os.environ.get('RESPONSE_CACHE_TTL', 86400))    # seconds
+    RESPONSE_CACHE_PERSISTENT = os.environ.get('RESPONSE_CACHE_PERSISTENT', 'false').lower() == 'true'
+    RESPONSE_CACHE_PURGE_INTERVAL = int(os.environ.get('RESPONSE_CACHE_PURGE_INTERVAL', 3600))  # seconds between expired-row purges
+    
+    # Coalesce concurrent identical generations into one engine call. Across workers this
+    # uses lock files on the host and hands results over through the persistent cache,
+    # so COALESCE_CROSS_WORKER only has an effect with RESPONSE_CACHE_PERSISTENT set
+    COALESCE_ENABLED = os.environ.get('COALESCE_ENABLED', 'true').lower() == 'true'
+    COALESCE_CROSS_WORKER = os.environ.get('COALESCE_CROSS_WORKER', 'true').lower() == 'true'
+    COALESCE_WAIT_TIMEOUT = float(os.environ.get('COALESCE_WAIT_TIMEOUT', 90))  # seconds before generating anyway
+    COALESCE_LOCK_DIR = os.environ.get('COALESCE_LOCK_DIR')                     # defaults to instance/locks
+    
+    # Bangla translation
+    # Load the model at startup: once in the gunicorn master with GUNICORN_PRELOAD, otherwise
+    # in every worker. Off by default so workers that never translate don't load it at all
+    TRANSLATION_WARMUP = os.environ.get('TRANSLATION_WARMUP', 'false').lower() == 'true'
+    # Download missing language packages inside a request; otherwise only `flask install-translation`
+    # (run by the Procfile) and the warm-up install them
+    TRANSLATION_AUTO_INSTALL = os.environ.get('TRANSLATION_AUTO_INSTALL', 'false').lower() == 'true'
+    TRANSLATION_WORKERS = int(os.environ.get('TRANSLATION_WORKERS', 2))         # threads translating batches
+    TRANSLATION_BATCH_SIZE = int(os.environ.get('TRANSLATION_BATCH_SIZE', 8))   # sentences per batch
+    TRANSLATION_CACHE_SIZE = int(os.environ.get('TRANSLATION_CACHE_SIZE', 4096))  # cached sentences per worker
+    TRANSLATION_RETRY_INTERVAL = int(os.environ.get('TRANSLATION_RETRY_INTERVAL', 300))  # seconds before retrying a failed load
+    
+    # Per-worker cache of the user fields checked on every request (id, is_paid)
+    USER_CACHE_SIZE = int(os.environ.get('USER_CACHE_SIZE', 4096))
+    USER_CACHE_TTL = int(os.environ.get('USER_CACHE_TTL', 30))  # seconds; bounds cross-worker staleness of is_paid
+    
+    # API tokens
+    TOKEN_BACKEND = os.environ.get('TOKEN_BACKEND', 'database')     # 'database' or 'sqlite'
+    TOKEN_SQLITE_PATH = os.environ.get('TOKEN_SQLITE_PATH')         # defaults to instance/tokens.db
+    TOKEN_TTL = int(os.environ.get('TOKEN_TTL', 7 * 86400))         # seconds a token stays valid
+    TOKEN_CACHE_SIZE = int(os.environ.get('TOKEN_CACHE_SIZE', 1024))  # validated tokens cached per worker
+    TOKEN_CACHE_TTL = int(os.environ.get('TOKEN_CACHE_TTL', 60))      # seconds; bounds revocation lag across workers
+    TOKEN_PURGE_INTERVAL = int(os.environ.get('TOKEN_PURGE_INTERVAL', 3600))  # seconds between expired-token purges
+    TOKEN_PURGE_BATCH_SIZE = int(os.environ.get('TOKEN_PURGE_BATCH_SIZE', 500))
+    
+    # Metrics (/metrics, Prometheus text format) and Server-Timing headers
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'true').lower() == 'true'
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')  # when set, scrapes need 'Authorization: Bearer <token>'
\ No newline at end of file
@@ -0,0 +1,46 @@
+"""Gunicorn settings: gunicorn -c gunicorn.conf.py run:app
+
+The values come from the GUNICORN_* settings in config.Config, where the
+serving profile is documented. GUNICORN_PRELOAD=true imports the app once in
+the master process; with TRANSLATION_WARMUP=true as well, the Bangla
+translation model is loaded there before forking, so every worker shares that
+copy of the model copy-on-write instead of loading its own.
+"""
+import os
+from config import Config
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+workers = Config.GUNICORN_WORKERS
+worker_class = Config.GUNICORN_WORKER_CLASS
+threads = Config.GUNICORN_THREADS
+timeout = Config.GUNICORN_TIMEOUT
+keepalive = Config.GUNICORN_KEEPALIVE
+preload_app = Config.GUNICORN_PRELOAD
+
+# Load the translator in the master (only with preload_app)
+preload_translator = preload_app and Config.TRANSLATION_WARMUP
+if preload_app:
+    # A background warm-up thread started in the master would not survive the
+    # fork (and could leave its lock held in the workers), so load synchronously
+    # in when_ready instead
+    Config.TRANSLATION_WARMUP = False
+
+def when_ready(server):
+    """Runs in the master after the app is preloaded and before workers are forked"""
+    if not preload_translator:
+        return
+    server.app.wsgi()
+    from app.utils.translate import translation_service
+    try:
+        translation_service.load(install=True)
+        server.log.info("Translation model loaded in the master; workers will share it")
+    except Exception as e:
+        server.log.warning(f"Translation preload failed, workers will load it on demand: {e}")
+
+def post_fork(server, worker):
+    if not preload_app:
+        return
+    # Don't share database connections the master may have opened with the workers
+    from app import db
+    with server.app.wsgi().app_context():
+        db.engine.dispose(close=False)
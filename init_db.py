@@ -1,7 +1,10 @@
-# init_db.py
+# init_db.py  (same as `flask --app run init-db`)
 
-from app import db, app
+from app import create_app
+from app.commands import init_schema
+
+app = create_app()
 
 with app.app_context():
-    db.create_all()
-    print("✅ Database initialized!")
\ No newline at end of file
+    init_schema()
+    print("✅ Database initialized!")
@@ -1,5 +1,6 @@
 # reset_db.py
-from app import create_app, db
+from app import create_app
+from app.commands import init_schema
 import os
 
 app = create_app()
@@ -12,5 +13,5 @@ with app.app_context():
         print(f"Removed existing database: {db_path}")
     
     # Create all tables
-    db.create_all()
+    init_schema()
     print("✅ Database recreated with updated schema!")
\ No newline at end of file
@@ -28,7 +28,8 @@ for path in potential_paths:
             sys.exit(1)
 
 if not found_db:
-    print("No existing database found. Will create new one on app startup.")
+    print("No existing database found.")
 
-print("\nNow manually restart the Flask application to create a fresh database.")
+print("\nNow run `flask --app run init-db` (or python init_db.py) to create a fresh database,")
+print("then restart the Flask application.")
 print("Then try registering again.")
\ No newline at end of file